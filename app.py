@@ -1,29 +1,24 @@
 import streamlit as st
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.runnables import RunnablePassthrough
-from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.output_parsers import StrOutputParser
 import os
 from dotenv import load_dotenv
 import time 
+import uuid
 
-# --- IMPORTAÇÕES PARA O AGENTE SQL (Existentes) ---
-from langchain_core.tools import tool
-from langchain_community.agent_toolkits import create_sql_agent
-from langchain_community.utilities import SQLDatabase
-
-# --- NOVAS IMPORTAÇÕES (RAG/Embeddings e PDF) ---
-from langchain_community.vectorstores import Chroma
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter 
-from langchain_core.output_parsers import StrOutputParser
-from langchain_huggingface import HuggingFaceEmbeddings
+# --- IMPORTAÇÕES PESADAS SÃO ADIADAS ---
+# Gemini (langchain_google_genai), Agente SQL (agent_toolkits), Chroma/PyPDFLoader e
+# HuggingFaceEmbeddings (torch) só são importados no 1º uso do cérebro que precisa deles,
+# dentro das funções obter_*() abaixo. Quem só conversa no modo GERAL nunca carrega torch.
+# Para medir o tempo de import na inicialização: python perfil_imports.py
 
-# Importa as funções do db (incluindo a db_engine)
+# Importa as funções do db
 from db import (
-    db_engine, 
+    obter_db_engine,
     listar_conversas,
     criar_nova_conversa,
     carregar_mensagens,
@@ -31,184 +26,260 @@ from db import (
     deletar_conversa,
     atualizar_titulo_conversa
 )
+from rollups_vendas import (
+    INSTRUCOES_ROLLUP,
+    INSTRUCOES_ROLLUP_INDISPONIVEL,
+    atualizar_rollups_vendas,
+    rollups_disponiveis,
+    tabelas_rollup_existentes
+)
+from indexacao_pdf import ConflitoDeVersao, indexar_pdf, usar_documento
+from compressao_contexto import montar_chain_rag
+from prefetch_especulativo import (
+    iniciar_prefetch, usar_prefetch, descartar_prefetch, registrar_uso_cache, resumo_metricas
+)
 
 # Carrega as variáveis de ambiente
 load_dotenv()
 
-# --- Configuração do LLM e Embeddings ---
-try:
+# Modo especulativo: enquanto o roteador decide, já busca o contexto de cada cérebro
+# (trechos do PDF, schema de 'vendas', histórico). Desligue com MODO_ESPECULATIVO=0 no .env
+MODO_ESPECULATIVO = os.getenv("MODO_ESPECULATIVO", "1").strip() != "0"
+
+# Compressão local dos trechos do PDF antes do prompt do RAG (menos tokens no Gemini).
+# Desligue com COMPRIMIR_CONTEXTO_RAG=0 no .env
+COMPRIMIR_CONTEXTO_RAG = os.getenv("COMPRIMIR_CONTEXTO_RAG", "1").strip() != "0"
+
+# --- Configuração do LLM e Embeddings (carregados no 1º uso) ---
+# @st.cache_resource: criados 1 vez por processo, e não a cada rerun do Streamlit
+@st.cache_resource
+def obter_llm():
+    inicio = time.perf_counter()
+    from langchain_google_genai import ChatGoogleGenerativeAI
     llm = ChatGoogleGenerativeAI(model="models/gemini-2.5-flash-preview-09-2025",
                                  google_api_key=os.getenv("GEMINI_API_KEY"),
                                  convert_system_message_to_human=True)
-    
+    print(f"DEBUG: LLM (Gemini) carregado em {time.perf_counter() - inicio:.2f}s.")
+    return llm
+
+
+@st.cache_resource
+def obter_embeddings():
+    inicio = time.perf_counter()
+    from langchain_huggingface import HuggingFaceEmbeddings
     embeddings = HuggingFaceEmbeddings(
     model_name="all-MiniLM-L6-v2"
     # Deixamos a biblioteca decidir o device (ela vai usar CPU)
     )
-    print("DEBUG: Embeddings locais (HuggingFace) carregados.")
-except Exception as e:
-    st.error(f"Erro LLM/Embeddings: {e}")
-    st.stop()
+    print(f"DEBUG: Embeddings locais (HuggingFace) carregados em {time.perf_counter() - inicio:.2f}s.")
+    return embeddings
 
 # --- 1.1 Mini-Chain para gerar títulos ---
-# (Sem alterações, continua perfeita)
-try:
-    prompt_titulo_template = ChatPromptTemplate.from_template(
-        "Gere um título muito curto e descritivo (máximo 5 palavras, idealmente 2-3) para uma conversa de chatbot que começa com a seguinte mensagem do usuário: '{primeira_mensagem}'. O título deve resumir o tópico principal. Responda APENAS com o título, sem introduções como 'Título:', sem aspas e sem pontuação final."
-    )
+prompt_titulo_template = ChatPromptTemplate.from_template(
+    "Gere um título muito curto e descritivo (máximo 5 palavras, idealmente 2-3) para uma conversa de chatbot que começa com a seguinte mensagem do usuário: '{primeira_mensagem}'. O título deve resumir o tópico principal. Responda APENAS com o título, sem introduções como 'Título:', sem aspas e sem pontuação final."
+)
+
+@st.cache_resource
+def obter_chain_gerar_titulo():
     chain_gerar_titulo = RunnablePassthrough.assign(
-        primeira_mensagem=lambda x: x['input']) | prompt_titulo_template | llm
+        primeira_mensagem=lambda x: x['input']) | prompt_titulo_template | obter_llm()
     print("DEBUG: Chain de título criada.")
-except Exception as e:
-    st.warning(f"Aviso: Chain de título não criada: {e}")
-    chain_gerar_titulo = None
+    return chain_gerar_titulo
 
 # --- 2. CONFIGURAÇÃO DOS 3 "CÉREBROS" ---
 
 # Função para buscar o histórico DO BANCO DE DADOS (usada por todos)
 def get_session_history(session_id):
     if session_id is None:
-        return ChatMessageHistory()
+        return InMemoryChatMessageHistory()
     mensagens_do_banco = carregar_mensagens(session_id)
-    history = ChatMessageHistory()
+    history = InMemoryChatMessageHistory()
     for msg in mensagens_do_banco:
         history.add_message(msg)
     return history
 
 # --- CÉREBRO 1: CHAT GERAL (RESTAURADO) ---
 # Este é o seu 'v4' que funcionava
-try:
-    prompt_template_geral = ChatPromptTemplate.from_messages(
-        [
-            ("system", "Você é um assistente prestativo. Responda às perguntas do usuário da forma mais completa e educada possível."),
-            MessagesPlaceholder(variable_name="history"),
-            ("human", "{input}"),
-        ]
-    )
+prompt_template_geral = ChatPromptTemplate.from_messages(
+    [
+        ("system", "Você é um assistente prestativo. Responda às perguntas do usuário da forma mais completa e educada possível."),
+        MessagesPlaceholder(variable_name="history"),
+        ("human", "{input}"),
+    ]
+)
+
+@st.cache_resource
+def obter_chains_geral():
+    """Retorna (chain_geral, chain_with_memory)."""
+    chain_geral = prompt_template_geral | obter_llm()
     chain_with_memory = RunnableWithMessageHistory(
-        prompt_template_geral | llm, 
+        chain_geral, 
         get_session_history,
         input_messages_key="input",
         history_messages_key="history",
     )
     print("DEBUG: Cérebro 1 (Chat Geral) RESTAURADO e criado.")
-except Exception as e:
-    st.error(f"Erro Chain Memória: {e}")
-    st.stop()
+    return chain_geral, chain_with_memory
 
 # --- CÉREBRO 2: AGENTE DE VENDAS (SQL) ---
-# (Sem alterações, continua perfeito)
-agente_sql = None
-especialista_vendas = None
-try:
+# O cron pode criar os resumos com o app já no ar (deploy primeiro, cron depois):
+# a lista é rechecada a cada minuto e, se mudar, o SQLDatabase e o agente são recriados.
+@st.cache_data(ttl=60)
+def tabelas_rollup_atuais():
+    return tuple(tabelas_rollup_existentes())
+
+
+@st.cache_resource
+def obter_db_sql(tabelas_rollup=()):
+    """SQLDatabase com 'vendas' + os resumos 'tabelas_rollup'. Um por conjunto de resumos."""
+    db_engine = obter_db_engine()
     if db_engine is None:
-        st.warning("Aviso: Engine SQLAlchemy não foi criada. O 'Modo Vendas' não funcionará.")
-    else:
-        db_sql = SQLDatabase(engine=db_engine, include_tables=['vendas'])
-        agente_sql_executor = create_sql_agent(
-            llm=llm,
-            db=db_sql,
-            verbose=True, 
-            agent_type="tool-calling" # Corrigido com hífen
-        )
-        
-        def especialista_vendas(input_str: str): 
-            print(f"DEBUG: Cérebro 2 (Especialista Vendas) chamado com input: {input_str}")
-            try:
-                resultado = agente_sql_executor.invoke({"input": input_str})
-                return resultado.get("output", "Não consegui processar a consulta SQL.")
-            except Exception as e:
-                print(f"ERRO no especialista_vendas: {e}")
-                return f"Houve um erro ao consultar o banco de dados de vendas: {e}"
-        
-        print("DEBUG: Cérebro 2 (Especialista Vendas) criado com sucesso.")
+        raise RuntimeError("Engine SQLAlchemy não foi criada. O 'Modo Vendas' não funcionará.")
+    from langchain_community.utilities import SQLDatabase
+    # Se os resumos estão em dia ou não é decidido a cada pergunta, em especialista_vendas().
+    return SQLDatabase(engine=db_engine, include_tables=['vendas'] + list(tabelas_rollup))
+
+
+@st.cache_resource
+def obter_agente_sql(tabelas_rollup=()):
+    """Agente SQL (a parte pesada: agent_toolkits), criado na 1ª pergunta de vendas."""
+    inicio = time.perf_counter()
+    from langchain_community.agent_toolkits import create_sql_agent
+    agente_sql_executor = create_sql_agent(
+        llm=obter_llm(),
+        db=obter_db_sql(tabelas_rollup),
+        verbose=True, 
+        agent_type="tool-calling" # Corrigido com hífen
+    )
+    print(f"DEBUG: Cérebro 2 (Especialista Vendas) criado com sucesso em {time.perf_counter() - inicio:.2f}s.")
+    return agente_sql_executor
 
-except Exception as e:
-    st.error(f"ERRO CRÍTICO: Não foi possível criar o Agente SQL: {e}")
+
+# "db": o SQLDatabase, guardado aqui depois que o cérebro SQL o usou com sucesso;
+# "info": (instante, schema + linhas de exemplo) do último prefetch do schema.
+@st.cache_resource
+def obter_cache_esquema_sql():
+    return {}
+
+
+# Validade (segundos) do schema pré-carregado: passado esse tempo, a próxima mensagem
+# busca de novo durante o roteamento (pega ALTER TABLE e linhas de exemplo novas).
+TTL_ESQUEMA_SQL_S = 300
+
+
+def esquema_sql_recente(cache_esquema):
+    """Schema guardado no cache, se ainda estiver na validade; senão None."""
+    guardado = cache_esquema.get("info")
+    if guardado and time.monotonic() - guardado[0] <= TTL_ESQUEMA_SQL_S:
+        return guardado[1]
+    return None
+
+
+def obter_db_sql_ou_none():
+    """
+    Como obter_db_sql(), com os resumos que existem agora, mas devolve None (e loga)
+    se o banco de vendas não estiver disponível.
+    """
+    try:
+        if obter_db_engine() is None:
+            raise RuntimeError("Engine SQLAlchemy não foi criada (banco fora do ar?).")
+        return obter_db_sql(tabelas_rollup_atuais())
+    except Exception as e:
+        print(f"ERRO CRÍTICO: Não foi possível criar o Agente SQL: {e}")
+        return None
+
+
+def especialista_vendas(input_str: str, contexto_esquema=None): 
+    print(f"DEBUG: Cérebro 2 (Especialista Vendas) chamado com input: {input_str}")
+    try:
+        tabelas_rollup = tabelas_rollup_atuais()
+        agente_sql_executor = obter_agente_sql(tabelas_rollup)
+        # Soma nos resumos só as vendas novas (no máximo 1x por minuto; carga grande fica para o cron)
+        atualizar_rollups_vendas(apenas_incremental=True)
+        if tabelas_rollup:
+            # Só manda usar os resumos se a marca d'água estiver em dia
+            input_str += INSTRUCOES_ROLLUP if rollups_disponiveis() else INSTRUCOES_ROLLUP_INDISPONIVEL
+        if contexto_esquema:
+            # Schema já carregado (prefetch): o agente não precisa gastar rodadas listando tabelas
+            input_str = f"{input_str}\n\nSchema das tabelas disponíveis (consultado há poucos minutos; só consulte de novo se faltar alguma tabela ou coluna):\n{contexto_esquema}"
+        resultado = agente_sql_executor.invoke({"input": input_str})
+        return resultado.get("output", "Não consegui processar a consulta SQL.")
+    except Exception as e:
+        print(f"ERRO no especialista_vendas: {e}")
+        return f"Houve um erro ao consultar o banco de dados de vendas: {e}"
 
 # --- CÉREBRO 3: CONSULTOR DE DOCUMENTOS (RAG) ---
 
-# A OTIMIZAÇÃO: @st.cache_resource
-@st.cache_resource(ttl=3600) # Limpa o cache a cada 1 hora
-def processar_pdf_para_rag(_file_id, file_content, file_name):
+# Índice de documentos do processo ((dono, nome do PDF) -> páginas/embeddings).
+# Cada sessão só enxerga e atualiza os documentos que ela mesma enviou; dentro dessa
+# linhagem, uma nova versão do PDF reindexa só as páginas alteradas. Documentos sem
+# uso expiram (TTL + limite de tamanho em indexacao_pdf.py) e têm a coleção apagada.
+@st.cache_resource
+def obter_indice_documentos():
+    return {}
+
+
+def documentos_da_sessao(dono):
+    """Nomes dos PDFs já indexados por esta sessão (candidatos a 'nova versão de')."""
+    return sorted(nome for (d, nome) in list(obter_indice_documentos()) if d == dono)
+
+
+def processar_pdf_para_rag(file_content, file_name, dono, versao_de=None):
     """
-    Processa o PDF anexado e RETORNA a chain RAG pronta.
-    O @st.cache_resource impede que isso rode duas vezes para o mesmo arquivo.
+    Processa o PDF anexado e RETORNA (chain RAG pronta, retriever, relatório da indexação).
+    A indexação é incremental: páginas já embedadas (mesmo hash) são reaproveitadas.
     """
-    print(f"DEBUG: Processando PDF '{file_name}' PELA PRIMEIRA VEZ (Gastando Quota de API)...")
+    print(f"DEBUG: Processando PDF '{file_name}'...")
     try:
-        # Salva o arquivo temporariamente
-        with open(file_name, "wb") as f:
-            f.write(file_content)
-        
-        loader = PyPDFLoader(file_name)
-        docs = loader.load()
-        os.remove(file_name) # Limpa o arquivo temporário
+        embeddings = obter_embeddings()
+        vector_store, relatorio = indexar_pdf(
+            obter_indice_documentos(), file_content, file_name, embeddings, dono, versao_de
+        )
 
-        if not docs:
+        if vector_store is None:
             print("Erro: Não foi possível ler o conteúdo do PDF.")
-            return None
-
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        splits = text_splitter.split_documents(docs)
-        
-        # ATENÇÃO: É AQUI QUE O SEU ERRO 429 (QUOTA) VAI ACONTECER (NA 1ª VEZ)
-        vector_store = Chroma.from_documents(documents=splits, embedding=embeddings)
+            return None, None, None
         
         retriever = vector_store.as_retriever()
         
-        rag_prompt = ChatPromptTemplate.from_template(
-            """Baseado APENAS no contexto abaixo, responda à pergunta:
-            Contexto: {contexto}
-            Pergunta: {pergunta}
-            Resposta:"""
-        )
-        
-        rag_chain = (
-            RunnablePassthrough.assign(contexto=(lambda x: retriever.invoke(x["pergunta"])))
-            | rag_prompt
-            | llm
-            | StrOutputParser()
-        )
+        # retriever -> (compressão local) -> rag_prompt -> llm
+        rag_chain = montar_chain_rag(retriever, obter_llm(), embeddings, comprimir=COMPRIMIR_CONTEXTO_RAG)
         
         print(f"DEBUG: PDF '{file_name}' processado e 'chain' criada com sucesso.")
-        return rag_chain
+        return rag_chain, retriever, relatorio
         
     except Exception as e:
-        # O ERRO 429 VAI APARECER AQUI
         print(f"ERRO DETALHADO ao processar PDF: {e}")
-        if os.path.exists(file_name):
-            os.remove(file_name)
         # Re-lança o erro para o Streamlit mostrar
         raise e
 
 
 # --- CÉREBRO 0: O ROTEADOR (NOVO) ---
-try:
-    roteador_prompt_template = """
-    Sua tarefa é classificar a pergunta do usuário em uma de três categorias: 'SQL', 'RAG', ou 'GERAL'.
-
-    Contexto:
-    - Um PDF está anexado: {contexto_rag}
-
-    Regras de Classificação:
-    1.  Se a pergunta for sobre vendas, clientes, produtos, valores, faturamento, ou qualquer coisa da tabela 'vendas', 
-        responda APENAS com a palavra: SQL
-    2.  Se {contexto_rag} for True E a pergunta for sobre o documento PDF anexado (como garantias, políticas, termos, etc.), 
-        responda APENAS com a palavra: RAG
-    3.  Para todo o resto (cumprimentos, piadas, conversas aleatórias, ou se {contexto_rag} for False e a pergunta for sobre um PDF), 
-        responda APENAS com a palavra: GERAL
-
-    Pergunta do Usuário:
-    '{input}'
-    """
-    
-    roteador_prompt = ChatPromptTemplate.from_template(roteador_prompt_template)
-    chain_roteadora = roteador_prompt | llm | StrOutputParser()
+roteador_prompt_template = """
+Sua tarefa é classificar a pergunta do usuário em uma de três categorias: 'SQL', 'RAG', ou 'GERAL'.
+
+Contexto:
+- Um PDF está anexado: {contexto_rag}
+
+Regras de Classificação:
+1.  Se a pergunta for sobre vendas, clientes, produtos, valores, faturamento, ou qualquer coisa da tabela 'vendas', 
+    responda APENAS com a palavra: SQL
+2.  Se {contexto_rag} for True E a pergunta for sobre o documento PDF anexado (como garantias, políticas, termos, etc.), 
+    responda APENAS com a palavra: RAG
+3.  Para todo o resto (cumprimentos, piadas, conversas aleatórias, ou se {contexto_rag} for False e a pergunta for sobre um PDF), 
+    responda APENAS com a palavra: GERAL
+
+Pergunta do Usuário:
+'{input}'
+"""
+
+roteador_prompt = ChatPromptTemplate.from_template(roteador_prompt_template)
+
+@st.cache_resource
+def obter_chain_roteadora():
+    chain_roteadora = roteador_prompt | obter_llm() | StrOutputParser()
     print("DEBUG: Cérebro 0 (Roteador) criado com sucesso.")
-except Exception as e:
-    st.error(f"Erro ao criar o Roteador: {e}")
-    st.stop()
+    return chain_roteadora
 
 
 # --- 3. CONFIGURAÇÃO DO FRONTEND (Streamlit) ---
@@ -218,13 +289,31 @@ st.title("Meu Chatbot com Gemini (Roteador Automático) 💾🤖")
 # --- Barra Lateral (Sidebar) ---
 st.sidebar.title("Minhas Conversas")
 
+# Identifica quem enviou cada PDF: só os documentos desta sessão podem ganhar novas versões
+if "rag_dono" not in st.session_state:
+    st.session_state.rag_dono = uuid.uuid4().hex
+
 if st.sidebar.button("➕ Novo Chat", key="novo_chat_sidebar_button"):
+    rag_dono = st.session_state.rag_dono
     st.session_state.clear() # Limpa TUDO (ID do chat, RAG, etc)
+    st.session_state.rag_dono = rag_dono # ...menos o dono dos PDFs já indexados
     st.rerun()
 
 st.sidebar.divider()
 
 # --- CORREÇÃO: UPLOADER DE VOLTA À SIDEBAR (Seu Pedido) ---
+# Um PDF com o mesmo nome é nova versão automaticamente; com outro nome, o usuário escolhe de qual documento
+documentos_anteriores = documentos_da_sessao(st.session_state.rag_dono)
+versao_de = None
+if documentos_anteriores:
+    escolha = st.sidebar.selectbox(
+        "O próximo PDF é uma nova versão de:",
+        ["(documento novo)"] + documentos_anteriores,
+        key="sidebar_versao_de"
+    )
+    if escolha != "(documento novo)":
+        versao_de = escolha
+
 uploaded_file = st.sidebar.file_uploader(
     "Anexe um PDF para fazer perguntas sobre ele", 
     type="pdf", 
@@ -232,20 +321,25 @@ uploaded_file = st.sidebar.file_uploader(
 )
 
 if uploaded_file:
-    # Checa se o arquivo é novo
-    if "rag_file_name" not in st.session_state or st.session_state.rag_file_name != uploaded_file.name:
+    # Checa se o arquivo é novo (pelo file_id: uma nova versão pode ter o mesmo nome)
+    if st.session_state.get("rag_file_id") != uploaded_file.file_id:
         try:
             file_id = uploaded_file.file_id
             file_content = uploaded_file.getvalue()
             file_name = uploaded_file.name
             
-            # Tenta processar (só vai gastar API na 1ª vez)
-            rag_chain = processar_pdf_para_rag(file_id, file_content, file_name)
+            # Tenta processar (só embeda as páginas que ainda não estão no índice)
+            rag_chain, retriever, relatorio = processar_pdf_para_rag(
+                file_content, file_name, st.session_state.rag_dono, versao_de
+            )
             
             if rag_chain:
                 # Salva a chain e o nome na sessão
                 st.session_state.rag_chain = rag_chain
+                st.session_state.rag_retriever = retriever
                 st.session_state.rag_file_name = file_name
+                st.session_state.rag_file_id = file_id
+                st.session_state.rag_relatorio = relatorio
                 st.sidebar.success(f"'{file_name}' processado e pronto!")
                 
                 # Se for um chat novo, cria ele agora
@@ -260,9 +354,19 @@ if uploaded_file:
             else:
                 st.sidebar.error("Falha ao processar o PDF.")
 
+        except ConflitoDeVersao as e:
+            st.sidebar.error(str(e))
         except Exception as e:
             # O erro 429 vai aparecer aqui
             st.sidebar.error(f"Falha ao processar o PDF. (Erro 429?)")
+    elif st.session_state.get("rag_relatorio"):
+        # Mostra quanto da indexação foi reaproveitado da versão anterior do documento
+        relatorio = st.session_state.rag_relatorio
+        st.sidebar.caption(
+            f"Versão {relatorio['versao']}: {relatorio['paginas_reaproveitadas']} de {relatorio['paginas']} páginas "
+            f"reaproveitadas, {relatorio['chunks_embedados']} de {relatorio['chunks_total']} trechos embedados "
+            f"({relatorio['economia']:.0%} a menos que reindexar tudo)."
+        )
 elif "rag_file_name" in st.session_state:
     # Se já existe um PDF, mostra que ele está ativo
     st.sidebar.info(f"Contexto do PDF '{st.session_state.rag_file_name}' está ativo.")
@@ -397,43 +501,102 @@ if prompt := st.chat_input(placeholder, key="chat_input_principal"):
     
     # 3. Chamar o ROTEADOR (Cérebro 0) para decidir
     response_content = ""
+    prefetch = {}
     try:
+        chain_roteadora = obter_chain_roteadora()
         rag_anexado = "rag_chain" in st.session_state
+        if rag_anexado and not usar_documento(
+                obter_indice_documentos(), st.session_state.rag_dono, st.session_state.rag_file_name):
+            # O PDF expirou do índice (coleção apagada): a sessão precisa anexá-lo de novo
+            st.warning(f"O PDF '{st.session_state.rag_file_name}' ficou muito tempo sem uso e foi "
+                       f"descartado. Anexe-o de novo para fazer perguntas sobre ele.")
+            for chave in ("rag_chain", "rag_retriever", "rag_file_name", "rag_file_id", "rag_relatorio"):
+                st.session_state.pop(chave, None)
+            rag_anexado = False
+        cache_esquema = obter_cache_esquema_sql()
+
+        # 3.1 Modo especulativo: dispara o contexto de cada cérebro ENQUANTO o roteador decide
+        # (st.session_state só pode ser lido aqui, na thread principal)
+        if MODO_ESPECULATIVO:
+            # Histórico: leitura pura (carregar_mensagens não tira nada do arquivo nem trava linhas)
+            tarefas = {"geral": (lambda chat_id=active_chat_id: get_session_history(chat_id))}
+            if rag_anexado:
+                tarefas["rag"] = (lambda r=st.session_state.rag_retriever: r.invoke(prompt))
+            # O banco de vendas NÃO é conectado aqui: o schema só é pré-carregado se o
+            # cérebro SQL já montou o SQLDatabase antes (senão fica para quando ele for escolhido)
+            if "db" in cache_esquema and esquema_sql_recente(cache_esquema) is None:
+                # Schema + linhas de exemplo (o mesmo que a tool sql_db_schema do agente devolve)
+                def carregar_esquema(db=cache_esquema["db"], cache=cache_esquema):
+                    info = db.get_table_info()
+                    if cache.get("db") is db:  # o SQLDatabase pode ter sido trocado enquanto isso
+                        cache["info"] = (time.monotonic(), info)
+                    return info
+                tarefas["sql"] = carregar_esquema
+            prefetch = iniciar_prefetch(tarefas)
+
         with st.spinner("Analisando sua pergunta..."):
             categoria = chain_roteadora.invoke({
                 "input": prompt,
                 "contexto_rag": rag_anexado
             })
+        fim_roteamento = time.perf_counter()
         print(f"DEBUG: Roteador decidiu -> {categoria}")
 
         # 4. Executar o "Cérebro" correto com base na decisão
+        # (usa o resultado especulativo do cérebro escolhido e cancela os outros)
         
         # --- CÉREBRO 3 (RAG) ---
         if "RAG" in categoria:
             print(f"DEBUG: Modo RAG. Pergunta: {prompt}")
             rag_chain = st.session_state.rag_chain
+            _, contexto = usar_prefetch(prefetch, "rag", fim_roteamento)
+            descartar_prefetch(prefetch)
             with st.spinner(f"Consultando '{st.session_state.rag_file_name}'..."):
-                response_content = rag_chain.invoke({"pergunta": prompt})
+                response_content = rag_chain.invoke({"pergunta": prompt, "contexto": contexto})
 
         # --- CÉREBRO 2 (SQL) ---
         elif "SQL" in categoria:
             print(f"DEBUG: Modo Vendas. Pergunta: {prompt}")
-            if not especialista_vendas:
+            db_sql = obter_db_sql_ou_none()
+            if db_sql is None:
+                descartar_prefetch(prefetch)
                 st.error("O Agente SQL não está disponível. Verifique os erros no terminal.")
                 st.stop()
+            if cache_esquema.get("db") is not db_sql:
+                # SQLDatabase novo (os resumos apareceram): o schema guardado/pré-carregado não vale mais
+                cache_esquema.clear()
+                cache_esquema["db"] = db_sql
+                usou_prefetch, contexto_esquema = False, None
+            else:
+                usou_prefetch, contexto_esquema = usar_prefetch(prefetch, "sql", fim_roteamento)
+            if not usou_prefetch:
+                contexto_esquema = esquema_sql_recente(cache_esquema)
+                if contexto_esquema is not None:
+                    registrar_uso_cache("sql")
+            descartar_prefetch(prefetch)
             with st.spinner("Consultando banco de dados de Vendas..."):
-                response_content = especialista_vendas(prompt) # Chama a função direto
+                response_content = especialista_vendas(prompt, contexto_esquema) # Chama a função direto
 
         # --- CÉREBRO 1 (CHAT GERAL) ---
         else: # Categoria "GERAL"
             print(f"DEBUG: Modo Chat Geral. Pergunta: {prompt}")
+            usou_prefetch, historico = usar_prefetch(prefetch, "geral", fim_roteamento)
+            descartar_prefetch(prefetch)
             with st.spinner("Digitando..."):
-                response = chain_with_memory.invoke(
-                    {"input": prompt},
-                    config={"configurable": {"session_id": active_chat_id}}
-                )
+                chain_geral, chain_with_memory = obter_chains_geral()
+                if usou_prefetch:
+                    # Histórico já carregado: chama a chain direto, sem reler o banco
+                    response = chain_geral.invoke({"input": prompt, "history": historico.messages})
+                else:
+                    response = chain_with_memory.invoke(
+                        {"input": prompt},
+                        config={"configurable": {"session_id": active_chat_id}}
+                    )
                 response_content = response.content if hasattr(response, 'content') else str(response)
 
+        if MODO_ESPECULATIVO:
+            print(f"DEBUG: Métricas do prefetch especulativo: {resumo_metricas()}")
+
         # 5. Salvar a resposta da IA
         if response_content and response_content.strip():
             if not salvar_mensagem(active_chat_id, "ai", response_content):
@@ -443,11 +606,11 @@ if prompt := st.chat_input(placeholder, key="chat_input_principal"):
             st.warning("O LLM retornou uma resposta vazia.")
 
         # 6. Gerar Título (se for novo) - LÓGICA CORRIGIDA!
-        if is_new_chat and chain_gerar_titulo:
+        if is_new_chat:
             print("DEBUG: Novo chat, tentando gerar título...")
             try: # <-- O 'try' que estava causando o erro
                 with st.spinner("Gerando título..."):
-                    titulo_response = chain_gerar_titulo.invoke({"input": prompt})
+                    titulo_response = obter_chain_gerar_titulo().invoke({"input": prompt})
                     if titulo_response and hasattr(titulo_response, 'content') and titulo_response.content.strip():
                         novo_titulo = titulo_response.content
                         print(f"DEBUG: Título gerado: {novo_titulo}")
@@ -463,6 +626,7 @@ if prompt := st.chat_input(placeholder, key="chat_input_principal"):
         st.rerun()
 
     except Exception as e:
+        descartar_prefetch(prefetch)  # Se o roteador falhou, ninguém vai usar o prefetch
         # O erro 429 (Quota) do Google aparecerá aqui se o RAG for usado
         st.error(f"Erro ao processar mensagem: {e}")
         print(f"ERRO DETALHADO NO PROCESSAMENTO: {e}")
\ No newline at end of file
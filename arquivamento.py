@@ -0,0 +1,354 @@
+import gzip
+import json
+import time
+import mysql.connector
+
+# Reaproveita a mesma conexão configurada no db.py
+from db import get_db_connection
+
+# zstd é opcional: comprime melhor e mais rápido. Sem ele, usamos gzip (biblioteca padrão).
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Erros possíveis ao ler um blob arquivado (pacote de compressão ausente, blob corrompido, JSON inválido)
+ERROS_LEITURA_ARQUIVO = (RuntimeError, ValueError, OSError, EOFError)
+if zstandard is not None:
+    ERROS_LEITURA_ARQUIVO += (zstandard.ZstdError,)
+
+# Conversas sem mensagens novas há mais de X dias vão para o arquivo
+DIAS_PARA_ARQUIVAR = 90
+
+# Quantas conversas são arquivadas por execução do job (cada uma em sua própria transação)
+LIMITE_POR_EXECUCAO = 1000
+
+
+def criar_tabela_arquivo():
+    """Cria a tabela 'conversas_arquivadas' (1 blob comprimido por conversa) se não existir."""
+    conn = get_db_connection()
+    if not conn:
+        print("Não foi possível conectar ao banco para criar a tabela de arquivo.")
+        return False
+
+    success = False
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS conversas_arquivadas (
+                id_conversa INT PRIMARY KEY,
+                formato VARCHAR(10) NOT NULL,
+                mensagens_comprimidas LONGBLOB NOT NULL,
+                qtd_mensagens INT NOT NULL,
+                bytes_originais BIGINT NOT NULL,
+                bytes_comprimidos BIGINT NOT NULL,
+                data_arquivamento TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (id_conversa) REFERENCES conversas(id) ON DELETE CASCADE
+            );
+        """)
+        conn.commit()
+        success = True
+        print("Tabela de arquivo verificada/criada com sucesso.")
+    except mysql.connector.Error as err:
+        print(f"Erro ao criar tabela de arquivo: {err}")
+    finally:
+        cursor.close()
+        conn.close()
+    return success
+
+
+def comprimir(dados):
+    """Comprime bytes com zstd (se instalado) ou gzip. Retorna (formato, bytes)."""
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(dados)
+    return "gzip", gzip.compress(dados, compresslevel=9)
+
+
+def descomprimir(formato, dados):
+    """Desfaz a compressão feita por comprimir()."""
+    if formato == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Conversa arquivada com zstd, mas o pacote 'zstandard' não está instalado.")
+        return zstandard.ZstdDecompressor().decompress(dados)
+    if formato == "gzip":
+        return gzip.decompress(dados)
+    raise ValueError(f"Formato de arquivo desconhecido: {formato}")
+
+
+def mensagens_do_arquivo(formato, dados):
+    """Converte o blob arquivado de volta na lista de mensagens (dicts id/role/content/data_envio)."""
+    return json.loads(descomprimir(formato, dados).decode("utf-8"))
+
+
+def _arquivar_conversa(conn, id_conversa):
+    """
+    Move as mensagens de UMA conversa para o arquivo. Retorna (qtd, bytes_orig, bytes_comp).
+    Se a conversa já tem um blob arquivado (mensagens salvas depois do arquivamento),
+    junta as mensagens novas ao blob existente.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT id, role, content, data_envio
+            FROM mensagens
+            WHERE id_conversa = %s
+            ORDER BY data_envio ASC, id ASC
+            FOR UPDATE
+        """, (id_conversa,))
+        mensagens = cursor.fetchall()
+        if not mensagens:
+            conn.rollback()
+            return 0, 0, 0
+
+        for msg in mensagens:
+            msg['data_envio'] = msg['data_envio'].isoformat(sep=" ")
+
+        cursor.execute("""
+            SELECT formato, mensagens_comprimidas
+            FROM conversas_arquivadas
+            WHERE id_conversa = %s
+            FOR UPDATE
+        """, (id_conversa,))
+        arquivada = cursor.fetchone()
+        if arquivada:
+            # Junta com o que já estava no arquivo (sem repetir ids) e mantém a ordem da conversa
+            ids_quentes = {m['id'] for m in mensagens}
+            antigas = mensagens_do_arquivo(arquivada['formato'], arquivada['mensagens_comprimidas'])
+            mensagens = [m for m in antigas if m['id'] not in ids_quentes] + mensagens
+            mensagens.sort(key=lambda m: (m['data_envio'], m['id']))
+
+        dados = json.dumps(mensagens, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        formato, comprimido = comprimir(dados)
+
+        cursor.execute("""
+            INSERT INTO conversas_arquivadas
+                (id_conversa, formato, mensagens_comprimidas, qtd_mensagens, bytes_originais, bytes_comprimidos)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                formato = VALUES(formato),
+                mensagens_comprimidas = VALUES(mensagens_comprimidas),
+                qtd_mensagens = VALUES(qtd_mensagens),
+                bytes_originais = VALUES(bytes_originais),
+                bytes_comprimidos = VALUES(bytes_comprimidos),
+                data_arquivamento = CURRENT_TIMESTAMP
+        """, (id_conversa, formato, comprimido, len(mensagens), len(dados), len(comprimido)))
+        cursor.execute("DELETE FROM mensagens WHERE id_conversa = %s", (id_conversa,))
+        conn.commit()
+        return len(mensagens), len(dados), len(comprimido)
+    except (mysql.connector.Error, *ERROS_LEITURA_ARQUIVO):
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def arquivar_conversas_antigas(dias=DIAS_PARA_ARQUIVAR, limite=LIMITE_POR_EXECUCAO):
+    """
+    Job de arquivamento: move para 'conversas_arquivadas' as conversas cuja última
+    mensagem é mais antiga que 'dias'. A linha em 'conversas' continua (a sidebar não muda).
+    Retorna um dicionário com o resumo (conversas, mensagens, bytes economizados).
+    """
+    resumo = {"conversas": 0, "mensagens": 0, "bytes_originais": 0, "bytes_comprimidos": 0}
+    if not criar_tabela_arquivo():
+        return resumo
+
+    conn = get_db_connection()
+    if not conn:
+        return resumo
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT id_conversa
+            FROM mensagens
+            GROUP BY id_conversa
+            HAVING MAX(data_envio) < NOW() - INTERVAL %s DAY
+            LIMIT %s
+        """, (dias, limite))
+        candidatas = [linha[0] for linha in cursor.fetchall()]
+    except mysql.connector.Error as err:
+        print(f"Erro ao buscar conversas para arquivar: {err}")
+        candidatas = []
+    finally:
+        cursor.close()
+
+    try:
+        for id_conversa in candidatas:
+            try:
+                qtd, bytes_orig, bytes_comp = _arquivar_conversa(conn, id_conversa)
+            except (mysql.connector.Error, *ERROS_LEITURA_ARQUIVO) as err:
+                print(f"Erro ao arquivar conversa ID {id_conversa}: {err}")
+                continue
+            if qtd:
+                resumo["conversas"] += 1
+                resumo["mensagens"] += qtd
+                resumo["bytes_originais"] += bytes_orig
+                resumo["bytes_comprimidos"] += bytes_comp
+    finally:
+        conn.close()
+
+    resumo["bytes_economizados"] = resumo["bytes_originais"] - resumo["bytes_comprimidos"]
+    print(f"DEBUG: Arquivamento concluído: {resumo}")
+    return resumo
+
+
+def ler_mensagens_arquivadas(id_conversa, conn):
+    """
+    Lê as mensagens arquivadas de uma conversa SEM tirá-las do arquivo (só SELECT),
+    usando a conexão 'conn'. Retorna a lista de mensagens (dicts id/role/content/data_envio)
+    ou [] se não há nada arquivado ou o blob não pode ser lido neste host (o erro é logado).
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT formato, mensagens_comprimidas
+            FROM conversas_arquivadas
+            WHERE id_conversa = %s
+        """, (id_conversa,))
+        arquivada = cursor.fetchone()
+        if not arquivada:
+            return []
+        return mensagens_do_arquivo(arquivada['formato'], arquivada['mensagens_comprimidas'])
+    except mysql.connector.Error as err:
+        if err.errno != 1146:  # Tabela de arquivo ainda não existe: nada arquivado
+            print(f"Erro ao ler o arquivo da conversa ID {id_conversa}: {err}")
+        return []
+    except ERROS_LEITURA_ARQUIVO as err:
+        print(f"Erro ao ler o arquivo da conversa ID {id_conversa} ({type(err).__name__}): {err}")
+        return []
+    finally:
+        cursor.close()
+
+
+def restaurar_conversa(id_conversa, conn=None):
+    """
+    Devolve as mensagens de uma conversa arquivada para a tabela 'mensagens'
+    (mantendo ids e datas originais) e apaga o blob do arquivo. Se a tabela quente
+    já tem mensagens da conversa (salvas depois do arquivamento), as duas se juntam.
+    Retorna True se havia algo arquivado e foi restaurado.
+    Se 'conn' for passada, usa (e não fecha) essa conexão.
+
+    O chat NÃO chama esta função (ele lê o arquivo com ler_mensagens_arquivadas): as
+    datas antigas fariam o próximo job arquivar a conversa de novo. Use-a para
+    devolver uma conversa à tabela quente de propósito (--restaurar).
+    """
+    fechar_conexao = conn is None
+    if conn is None:
+        conn = get_db_connection()
+    if not conn:
+        return False
+
+    inicio = time.perf_counter()
+    success = False
+    cursor = conn.cursor(dictionary=True)
+    try:
+        # Checagem sem trava primeiro: quase sempre não há nada arquivado
+        cursor.execute("SELECT 1 FROM conversas_arquivadas WHERE id_conversa = %s", (id_conversa,))
+        if not cursor.fetchall():
+            conn.rollback()
+            return False
+
+        cursor.execute("""
+            SELECT formato, mensagens_comprimidas
+            FROM conversas_arquivadas
+            WHERE id_conversa = %s
+            FOR UPDATE
+        """, (id_conversa,))
+        arquivada = cursor.fetchone()
+        if not arquivada:
+            conn.rollback()
+            return False
+
+        mensagens = mensagens_do_arquivo(arquivada['formato'], arquivada['mensagens_comprimidas'])
+        # ids que já estão na tabela quente (ex.: vieram de uma importação) são mantidos
+        cursor.executemany("""
+            INSERT INTO mensagens (id, id_conversa, role, content, data_envio)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE id = id
+        """, [(m['id'], id_conversa, m['role'], m['content'], m['data_envio']) for m in mensagens])
+        cursor.execute("DELETE FROM conversas_arquivadas WHERE id_conversa = %s", (id_conversa,))
+        conn.commit()
+        success = True
+        latencia_ms = (time.perf_counter() - inicio) * 1000
+        print(f"DEBUG: Conversa ID {id_conversa} restaurada do arquivo "
+              f"({len(mensagens)} mensagens em {latencia_ms:.1f} ms).")
+    except mysql.connector.Error as err:
+        conn.rollback()
+        if err.errno == 1146:  # Tabela de arquivo ainda não existe: nada arquivado
+            return False
+        print(f"Erro ao restaurar conversa ID {id_conversa}: {err}")
+    except ERROS_LEITURA_ARQUIVO as err:
+        # Blob ilegível neste host (ex.: gravado com zstd e o pacote não está instalado aqui):
+        # o arquivo fica intacto e a conversa abre só com as mensagens da tabela quente.
+        conn.rollback()
+        print(f"Erro ao ler o arquivo da conversa ID {id_conversa} ({type(err).__name__}): {err}")
+    finally:
+        cursor.close()
+        if fechar_conexao:
+            conn.close()
+    return success
+
+
+def relatorio_arquivo():
+    """Retorna o total de conversas/mensagens arquivadas e os bytes economizados."""
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    relatorio = None
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT COUNT(*) AS conversas,
+                   COALESCE(SUM(qtd_mensagens), 0) AS mensagens,
+                   COALESCE(SUM(bytes_originais), 0) AS bytes_originais,
+                   COALESCE(SUM(bytes_comprimidos), 0) AS bytes_comprimidos
+            FROM conversas_arquivadas
+        """)
+        relatorio = cursor.fetchone()
+        relatorio["bytes_economizados"] = relatorio["bytes_originais"] - relatorio["bytes_comprimidos"]
+    except mysql.connector.Error as err:
+        print(f"Erro ao gerar relatório do arquivo: {err}")
+    finally:
+        cursor.close()
+        conn.close()
+    return relatorio
+
+
+# Se você rodar este arquivo diretamente (python arquivamento.py), ele arquiva as conversas frias.
+# Ideal para agendar no cron. Opções:
+#   --dias N       arquiva conversas sem mensagens há mais de N dias (padrão: 90)
+#   --otimizar     roda OPTIMIZE TABLE em 'mensagens' no final (devolve o espaço em disco)
+#   --restaurar ID restaura uma conversa e mostra a latência
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Arquivamento de conversas antigas.")
+    parser.add_argument("--dias", type=int, default=DIAS_PARA_ARQUIVAR)
+    parser.add_argument("--limite", type=int, default=LIMITE_POR_EXECUCAO)
+    parser.add_argument("--otimizar", action="store_true")
+    parser.add_argument("--restaurar", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.restaurar is not None:
+        inicio = time.perf_counter()
+        ok = restaurar_conversa(args.restaurar)
+        print(f"\nRestaurada: {ok} em {(time.perf_counter() - inicio) * 1000:.1f} ms")
+    else:
+        print(f"Arquivando conversas sem mensagens há mais de {args.dias} dias...")
+        resumo = arquivar_conversas_antigas(args.dias, args.limite)
+        print(f"\nConversas arquivadas: {resumo['conversas']} ({resumo['mensagens']} mensagens)")
+        print(f"Bytes: {resumo['bytes_originais']} -> {resumo['bytes_comprimidos']} "
+              f"(economia de {resumo['bytes_economizados']} bytes nesta execução)")
+
+        if args.otimizar and resumo["conversas"]:
+            conn = get_db_connection()
+            if conn:
+                cursor = conn.cursor()
+                cursor.execute("OPTIMIZE TABLE mensagens")
+                cursor.fetchall()
+                cursor.close()
+                conn.close()
+                print("Tabela 'mensagens' otimizada.")
+
+    print(f"\nTotal no arquivo: {relatorio_arquivo()}")
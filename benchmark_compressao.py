@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+from dotenv import load_dotenv
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from indexacao_pdf import indexar_pdf
+from compressao_contexto import montar_contexto_rag, rag_prompt, estimar_tokens
+
+# Compara o RAG com e sem a compressão local do contexto:
+# tokens do prompt (os que o Gemini informa em usage_metadata) e latência da resposta.
+#
+# Uso: python benchmark_compressao.py arquivo.pdf ["pergunta 1" "pergunta 2" ...]
+
+PERGUNTAS_PADRAO = [
+    "Qual é o prazo de garantia?",
+    "Quais são as condições para troca ou devolução?",
+    "Quais valores ou preços são mencionados no documento?",
+]
+
+load_dotenv()
+
+if len(sys.argv) < 2:
+    print("Uso: python benchmark_compressao.py arquivo.pdf [perguntas...]")
+    sys.exit(1)
+
+caminho_pdf = sys.argv[1]
+perguntas = sys.argv[2:] or PERGUNTAS_PADRAO
+
+llm = ChatGoogleGenerativeAI(model="models/gemini-2.5-flash-preview-09-2025",
+                             google_api_key=os.getenv("GEMINI_API_KEY"),
+                             convert_system_message_to_human=True)
+embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+
+with open(caminho_pdf, "rb") as f:
+    conteudo = f.read()
+# indexar_pdf grava/apaga um arquivo temporário com este nome: não use o caminho original
+vector_store, _ = indexar_pdf({}, conteudo, "benchmark_" + os.path.basename(caminho_pdf), embeddings, "benchmark")
+if vector_store is None:
+    print("Erro: não foi possível ler o conteúdo do PDF.")
+    sys.exit(1)
+retriever = vector_store.as_retriever()
+
+chains = {comprimir: montar_contexto_rag(retriever, embeddings, comprimir) | rag_prompt | llm
+          for comprimir in (False, True)}
+
+# Aquecimento (descartado): a 1ª chamada paga custos de partida (conexão com o Gemini,
+# modelo de embeddings na memória) que não são da compressão
+print("Aquecendo (resultado descartado)...")
+for chain in chains.values():
+    chain.invoke({"pergunta": perguntas[0]})
+
+# Os dois modos se alternam por pergunta e a ordem inverte a cada uma: nenhum modo
+# fica sempre com a 1ª chamada (nem com a 2ª, que pega cache/conexão quentes)
+totais = {comprimir: [0, 0.0] for comprimir in chains}
+for numero, pergunta in enumerate(perguntas):
+    ordem = (False, True) if numero % 2 == 0 else (True, False)
+    for comprimir in ordem:
+        inicio = time.perf_counter()
+        resposta = chains[comprimir].invoke({"pergunta": pergunta})
+        latencia = time.perf_counter() - inicio
+
+        uso = getattr(resposta, "usage_metadata", None) or {}
+        tokens = uso.get("input_tokens")
+        if tokens is None:
+            # Sem usage_metadata: estima pelo prompt montado
+            contexto = montar_contexto_rag(retriever, embeddings, comprimir).invoke({"pergunta": pergunta})
+            tokens = estimar_tokens(rag_prompt.format(**contexto))
+
+        totais[comprimir][0] += tokens
+        totais[comprimir][1] += latencia
+        print(f"[{'com' if comprimir else 'sem'} compressão] {pergunta!r}: "
+              f"{tokens} tokens de entrada, {latencia:.2f}s")
+resultados = {comprimir: (tokens / len(perguntas), latencia / len(perguntas))
+              for comprimir, (tokens, latencia) in totais.items()}
+
+(tokens_sem, latencia_sem), (tokens_com, latencia_com) = resultados[False], resultados[True]
+print("\nMédia por pergunta:")
+print(f"- Sem compressão: {tokens_sem:.0f} tokens, {latencia_sem:.2f}s")
+print(f"- Com compressão: {tokens_com:.0f} tokens, {latencia_com:.2f}s")
+print(f"- Redução: {1 - tokens_com / tokens_sem:.0%} dos tokens, {1 - latencia_com / latencia_sem:.0%} da latência")
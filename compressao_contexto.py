@@ -0,0 +1,129 @@
+import math
+import re
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnablePassthrough
+from langchain_core.output_parsers import StrOutputParser
+
+# Máximo de tokens (estimados) de contexto que vão para o prompt do RAG
+ORCAMENTO_TOKENS = 500
+
+# Estimativa simples de tokens (~4 caracteres por token), sem depender do tokenizer do Gemini
+CARACTERES_POR_TOKEN = 4
+
+# Frases muito curtas (números de página, cabeçalhos soltos) não valem um embedding
+MIN_CARACTERES_FRASE = 15
+
+# Quebra em fim de frase (. ! ?) ou em linha em branco
+_separador_frases = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+rag_prompt = ChatPromptTemplate.from_template(
+    """Baseado APENAS no contexto abaixo, responda à pergunta:
+    Contexto: {contexto}
+    Pergunta: {pergunta}
+    Resposta:"""
+)
+
+
+def estimar_tokens(texto):
+    return math.ceil(len(texto) / CARACTERES_POR_TOKEN)
+
+
+def _dividir_frases(texto):
+    for frase in _separador_frases.split(texto):
+        frase = " ".join(frase.split())
+        if len(frase) >= MIN_CARACTERES_FRASE:
+            yield frase
+
+
+def _frases_sem_sobreposicao(documentos):
+    """
+    Quebra os chunks em frases e remove as repetidas. Chunks vizinhos da mesma página
+    compartilham 200 caracteres, então a mesma frase (ou um pedaço dela, cortado na
+    borda do chunk) aparece duas vezes: fica só a versão completa, na 1ª posição.
+    """
+    frases = []
+    for doc in documentos:
+        pagina = doc.metadata.get("page")
+        for texto in _dividir_frases(doc.page_content):
+            chave = texto.lower()
+            mesma_pagina = [f for f in frases if f["pagina"] == pagina]
+            if any(chave in f["chave"] for f in mesma_pagina):
+                continue  # Repetida, ou pedaço de uma frase que já temos
+            # Esta frase completa uma que tinha sido cortada na borda do chunk anterior
+            cortadas = [f for f in mesma_pagina if f["chave"] in chave]
+            posicao = min((frases.index(f) for f in cortadas), default=len(frases))
+            frases = [f for f in frases if f not in cortadas]
+            frases.insert(min(posicao, len(frases)), {"texto": texto, "chave": chave, "pagina": pagina})
+    return frases
+
+
+def _similaridade(a, b):
+    produto = sum(x * y for x, y in zip(a, b))
+    norma = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return produto / norma if norma else 0.0
+
+
+def comprimir_contexto(pergunta, documentos, embeddings, orcamento_tokens=ORCAMENTO_TOKENS):
+    """
+    Comprime os chunks do retriever antes do prompt: remove a sobreposição entre chunks,
+    pontua cada frase pela similaridade com a pergunta (embeddings locais) e mantém só
+    as melhores até o orçamento de tokens, na ordem original e com a página de origem.
+    Retorna (contexto em texto, estatísticas).
+    """
+    frases = _frases_sem_sobreposicao(documentos)
+    tokens_originais = sum(estimar_tokens(d.page_content) for d in documentos)
+    if not frases:
+        return "", {"frases": 0, "frases_mantidas": 0, "tokens_originais": tokens_originais, "tokens_comprimidos": 0}
+
+    vetor_pergunta = embeddings.embed_query(pergunta)
+    vetores = embeddings.embed_documents([f["texto"] for f in frases])
+    for frase, vetor in zip(frases, vetores):
+        frase["pontuacao"] = _similaridade(vetor_pergunta, vetor)
+
+    # As mais relevantes primeiro, até estourar o orçamento (sempre mantém pelo menos 1)
+    mantidas, tokens = set(), 0
+    for indice in sorted(range(len(frases)), key=lambda i: frases[i]["pontuacao"], reverse=True):
+        custo = estimar_tokens(frases[indice]["texto"])
+        if mantidas and tokens + custo > orcamento_tokens:
+            continue
+        mantidas.add(indice)
+        tokens += custo
+
+    # Volta para a ordem do documento, agrupando as frases seguidas da mesma página
+    blocos = []
+    for indice, frase in enumerate(frases):
+        if indice not in mantidas:
+            continue
+        pagina = f"[Página {frase['pagina'] + 1}]" if isinstance(frase["pagina"], int) else "[Página ?]"
+        if blocos and blocos[-1][0] == pagina:
+            blocos[-1][1].append(frase["texto"])
+        else:
+            blocos.append((pagina, [frase["texto"]]))
+    contexto = "\n".join(f"{pagina} {' '.join(textos)}" for pagina, textos in blocos)
+
+    estatisticas = {
+        "frases": len(frases),
+        "frases_mantidas": len(mantidas),
+        "tokens_originais": tokens_originais,
+        "tokens_comprimidos": estimar_tokens(contexto),
+    }
+    print(f"DEBUG: Contexto RAG comprimido: {estatisticas}")
+    return contexto, estatisticas
+
+
+def montar_contexto_rag(retriever, embeddings, comprimir=True):
+    """
+    Etapa que preenche {contexto} para o rag_prompt. Se o 'contexto' já vier pronto
+    (prefetch especulativo), não busca de novo. Com 'comprimir', passa pelo comprimir_contexto().
+    """
+    etapa = RunnablePassthrough.assign(contexto=(lambda x: x.get("contexto") or retriever.invoke(x["pergunta"])))
+    if comprimir:
+        etapa = etapa | RunnablePassthrough.assign(
+            contexto=(lambda x: comprimir_contexto(x["pergunta"], x["contexto"], embeddings)[0]))
+    return etapa
+
+
+def montar_chain_rag(retriever, llm, embeddings, comprimir=True):
+    """Chain RAG completa: contexto (comprimido ou não) -> rag_prompt -> llm -> texto."""
+    return montar_contexto_rag(retriever, embeddings, comprimir) | rag_prompt | llm | StrOutputParser()
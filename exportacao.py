@@ -0,0 +1,404 @@
+import hashlib
+import json
+import os
+import time
+import mysql.connector
+
+# Reaproveita a mesma conexão configurada no db.py
+from db import get_db_connection
+from arquivamento import ERROS_LEITURA_ARQUIVO, mensagens_do_arquivo
+
+# Quantas linhas são lidas do cursor (exportação) ou gravadas por transação (importação)
+TAMANHO_LOTE = 5000
+
+# Colunas de cada tipo de registro, na ordem em que vão para o arquivo
+COLUNAS = {
+    "conversa": ["id", "titulo", "data_criacao"],
+    "mensagem": ["id", "id_conversa", "role", "content", "data_envio"],
+}
+
+TABELAS = {"conversa": "conversas", "mensagem": "mensagens"}
+
+SQL_INSERT = {
+    "conversa": """
+        INSERT INTO conversas (id, titulo, data_criacao)
+        VALUES (%s, %s, %s)
+    """,
+    "mensagem": """
+        INSERT INTO mensagens (id, id_conversa, role, content, data_envio)
+        VALUES (%s, %s, %s, %s, %s)
+    """,
+}
+
+# Usados com remapeamento: o banco escolhe um id novo (AUTO_INCREMENT)
+SQL_INSERT_SEM_ID = {
+    "conversa": "INSERT INTO conversas (titulo, data_criacao) VALUES (%s, %s)",
+    "mensagem": "INSERT INTO mensagens (id_conversa, role, content, data_envio) VALUES (%s, %s, %s, %s)",
+}
+
+
+class ConflitoDeIds(Exception):
+    """Um id do arquivo já existe no banco com outro conteúdo (e o remapeamento está desligado)."""
+
+
+# --- EXPORTAÇÃO ---
+
+def _linhas_em_streaming(conn, sql):
+    """
+    Executa o SELECT num cursor NÃO bufferizado (as linhas ficam no servidor e
+    chegam aos poucos), devolvendo-as em lotes. A memória usada é de 1 lote só.
+    """
+    cursor = conn.cursor(dictionary=True, buffered=False)
+    try:
+        cursor.execute(sql)
+        while True:
+            lote = cursor.fetchmany(TAMANHO_LOTE)
+            if not lote:
+                break
+            yield lote
+    finally:
+        cursor.close()
+
+
+def _registros_para_exportar(conn, arquivos_ilegiveis):
+    """
+    Gera os registros na ordem de importação: primeiro todas as conversas (por id),
+    depois as mensagens da tabela quente (por id) e por fim as mensagens que estão
+    no arquivo comprimido (conversas_arquivadas, por conversa), para o backup ficar
+    completo. As mensagens NÃO saem em ordem global de id: as arquivadas vêm depois
+    das quentes (a importação não depende dessa ordem).
+
+    Conversas cujo blob arquivado não pode ser lido são puladas: o id delas vai para
+    'arquivos_ilegiveis' e a exportação continua.
+    """
+    for lote in _linhas_em_streaming(conn, "SELECT id, titulo, data_criacao FROM conversas ORDER BY id"):
+        yield "conversa", lote
+
+    for lote in _linhas_em_streaming(conn, """
+            SELECT id, id_conversa, role, content, data_envio
+            FROM mensagens ORDER BY id"""):
+        yield "mensagem", lote
+
+    try:
+        for lote in _linhas_em_streaming(conn, """
+                SELECT id_conversa, formato, mensagens_comprimidas
+                FROM conversas_arquivadas ORDER BY id_conversa"""):
+            for arquivada in lote:
+                try:
+                    mensagens = mensagens_do_arquivo(arquivada['formato'], arquivada['mensagens_comprimidas'])
+                except ERROS_LEITURA_ARQUIVO as err:
+                    print(f"Erro ao ler o arquivo da conversa ID {arquivada['id_conversa']} "
+                          f"({type(err).__name__}): {err}. Mensagens arquivadas dela NÃO exportadas.")
+                    arquivos_ilegiveis.append(arquivada['id_conversa'])
+                    continue
+                for msg in mensagens:
+                    msg['id_conversa'] = arquivada['id_conversa']
+                yield "mensagem", mensagens
+    except mysql.connector.Error as err:
+        if err.errno != 1146:  # 1146 = tabela de arquivo não existe (nada arquivado)
+            raise
+
+
+def _valor_exportavel(valor):
+    """Datas viram texto no formato que o MySQL aceita de volta."""
+    if hasattr(valor, "isoformat"):
+        return valor.isoformat(sep=" ")
+    return valor
+
+
+def exportar_conversas(caminho, formato="jsonl"):
+    """
+    Exporta 'conversas' + 'mensagens' para JSONL (1 registro por linha, com o campo 'tipo')
+    ou Parquet (arquivos <caminho>.conversas.parquet e <caminho>.mensagens.parquet).
+    Retorna um dicionário com as contagens exportadas (e, em 'arquivos_ilegiveis',
+    as conversas cujas mensagens arquivadas não puderam ser lidas e ficaram de fora).
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    contagem = {"conversa": 0, "mensagem": 0}
+    arquivos_ilegiveis = []
+    inicio = time.perf_counter()
+    try:
+        if formato == "jsonl":
+            with open(caminho, "w", encoding="utf-8") as f:
+                for tipo, lote in _registros_para_exportar(conn, arquivos_ilegiveis):
+                    for linha in lote:
+                        registro = {"tipo": tipo}
+                        registro.update({col: _valor_exportavel(linha[col]) for col in COLUNAS[tipo]})
+                        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                    contagem[tipo] += len(lote)
+        elif formato == "parquet":
+            _exportar_parquet(conn, caminho, contagem, arquivos_ilegiveis)
+        else:
+            raise ValueError(f"Formato de exportação desconhecido: {formato}")
+    finally:
+        conn.close()
+
+    duracao = time.perf_counter() - inicio
+    print(f"DEBUG: Exportação concluída em {duracao:.1f}s: {contagem['conversa']} conversas, "
+          f"{contagem['mensagem']} mensagens ({contagem['mensagem'] / max(duracao, 1e-9) * 60:.0f} msgs/min).")
+    if arquivos_ilegiveis:
+        print(f"AVISO: {len(arquivos_ilegiveis)} conversa(s) com arquivo ilegível ficaram sem as mensagens "
+              f"arquivadas no backup: {arquivos_ilegiveis[:20]}{'...' if len(arquivos_ilegiveis) > 20 else ''}")
+    contagem["arquivos_ilegiveis"] = arquivos_ilegiveis
+    return contagem
+
+
+def _exportar_parquet(conn, caminho, contagem, arquivos_ilegiveis):
+    """Grava cada lote como um row group do Parquet (pyarrow é opcional, só para este formato)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Schema fixo: um lote com todos os títulos nulos não pode mudar o tipo da coluna
+    schemas = {
+        "conversa": pa.schema([("id", pa.int64()), ("titulo", pa.string()), ("data_criacao", pa.string())]),
+        "mensagem": pa.schema([("id", pa.int64()), ("id_conversa", pa.int64()), ("role", pa.string()),
+                               ("content", pa.string()), ("data_envio", pa.string())]),
+    }
+    escritores = {}
+    try:
+        for tipo, lote in _registros_para_exportar(conn, arquivos_ilegiveis):
+            colunas = {col: [_valor_exportavel(linha[col]) for linha in lote] for col in COLUNAS[tipo]}
+            if tipo not in escritores:
+                escritores[tipo] = pq.ParquetWriter(f"{caminho}.{tipo}s.parquet", schemas[tipo])
+            escritores[tipo].write_table(pa.table(colunas, schema=schemas[tipo]))
+            contagem[tipo] += len(lote)
+    finally:
+        for escritor in escritores.values():
+            escritor.close()
+
+
+# --- IMPORTAÇÃO ---
+
+def _registros_do_arquivo(caminho, formato):
+    """Lê o arquivo exportado em streaming, devolvendo (tipo, registro) um a um."""
+    if formato == "jsonl":
+        with open(caminho, encoding="utf-8") as f:
+            for linha in f:
+                if linha.strip():
+                    registro = json.loads(linha)
+                    yield registro["tipo"], registro
+    elif formato == "parquet":
+        import pyarrow.parquet as pq
+        for tipo in ("conversa", "mensagem"):
+            arquivo = f"{caminho}.{tipo}s.parquet"
+            if not os.path.exists(arquivo):
+                continue
+            for lote in pq.ParquetFile(arquivo).iter_batches(batch_size=TAMANHO_LOTE):
+                for registro in lote.to_pylist():
+                    yield tipo, registro
+    else:
+        raise ValueError(f"Formato de importação desconhecido: {formato}")
+
+
+def _chave_importacao(caminho):
+    """Identifica a importação de um arquivo (o checkpoint fica no banco com esta chave)."""
+    return hashlib.sha1(os.path.abspath(caminho).encode("utf-8")).hexdigest()
+
+
+def _criar_tabelas_checkpoint(cursor):
+    """
+    Checkpoint e mapa de ids remapeados ficam no banco: são gravados na MESMA transação
+    que o lote, então um lote nunca fica commitado sem o checkpoint (e vice-versa).
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS importacao_checkpoint (
+            chave CHAR(40) PRIMARY KEY,
+            arquivo VARCHAR(1024) NOT NULL,
+            registros_importados BIGINT NOT NULL,
+            data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS importacao_mapa_conversas (
+            chave CHAR(40) NOT NULL,
+            id_antigo INT NOT NULL,
+            id_novo INT NOT NULL,
+            PRIMARY KEY (chave, id_antigo)
+        );
+    """)
+
+
+def _ler_checkpoint(cursor, chave):
+    """Retorna (registros já importados, mapa id antigo -> id novo das conversas remapeadas)."""
+    cursor.execute("SELECT registros_importados FROM importacao_checkpoint WHERE chave = %s", (chave,))
+    linha = cursor.fetchone()
+    cursor.execute("SELECT id_antigo, id_novo FROM importacao_mapa_conversas WHERE chave = %s", (chave,))
+    mapa = dict(cursor.fetchall())
+    return (linha[0] if linha else 0), mapa
+
+
+def _salvar_checkpoint(cursor, chave, caminho, registros_importados):
+    cursor.execute("""
+        INSERT INTO importacao_checkpoint (chave, arquivo, registros_importados)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE registros_importados = VALUES(registros_importados)
+    """, (chave, os.path.abspath(caminho), registros_importados))
+
+
+def _apagar_checkpoint(cursor, chave):
+    cursor.execute("DELETE FROM importacao_mapa_conversas WHERE chave = %s", (chave,))
+    cursor.execute("DELETE FROM importacao_checkpoint WHERE chave = %s", (chave,))
+
+
+def _separar_conflitos(cursor, tipo, linhas):
+    """
+    Compara as linhas do lote com o que já está no banco (pelo id).
+    Retorna (novas, repetidas, conflitantes): 'repetidas' já existem com o mesmo conteúdo
+    (ex.: lote reimportado ao retomar); 'conflitantes' usam um id que no banco é de outro registro.
+    """
+    marcadores = ", ".join(["%s"] * len(linhas))
+    cursor.execute(
+        f"SELECT {', '.join(COLUNAS[tipo])} FROM {TABELAS[tipo]} WHERE id IN ({marcadores})",
+        [linha[0] for linha in linhas],
+    )
+    existentes = {linha[0]: tuple(_valor_exportavel(v) for v in linha) for linha in cursor.fetchall()}
+
+    novas, repetidas, conflitantes = [], [], []
+    for linha in linhas:
+        existente = existentes.get(linha[0])
+        if existente is None:
+            novas.append(linha)
+        elif existente == tuple(_valor_exportavel(v) for v in linha):
+            repetidas.append(linha)
+        else:
+            conflitantes.append(linha)
+    return novas, repetidas, conflitantes
+
+
+def importar_conversas(caminho, formato="jsonl", remapear_ids=False):
+    """
+    Importa um arquivo gerado por exportar_conversas() em lotes de TAMANHO_LOTE,
+    um lote por transação. Os ids originais são mantidos.
+
+    Ids que já existem no banco:
+    - com o mesmo conteúdo, a linha é pulada e contada em 'repetidas';
+    - com outro conteúdo (outra conversa/mensagem), a importação PARA com erro, a não ser
+      que 'remapear_ids' esteja ligado: aí o registro entra com um id novo e as mensagens
+      de uma conversa remapeada passam a apontar para o id novo dela.
+
+    Retomável: cada lote grava, na mesma transação, o total de registros importados
+    (importacao_checkpoint) e os ids que remapeou (importacao_mapa_conversas). Se o
+    processo cair, rodar de novo pula exatamente o que foi commitado.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    chave = _chave_importacao(caminho)
+    cursor = conn.cursor()
+    try:
+        _criar_tabelas_checkpoint(cursor)
+        ja_importados, mapa_conversas = _ler_checkpoint(cursor, chave)
+        conn.commit()
+    except mysql.connector.Error as err:
+        print(f"Erro ao preparar o checkpoint da importação: {err}")
+        cursor.close()
+        conn.close()
+        return None
+    if ja_importados:
+        print(f"DEBUG: Retomando importação a partir do registro {ja_importados}.")
+
+    contagem = {"conversa": 0, "mensagem": 0}
+    repetidas = {"conversa": 0, "mensagem": 0}
+    remapeadas = {"conversa": 0, "mensagem": 0}
+    lotes = {"conversa": [], "mensagem": []}
+    posicao = 0
+    inicio = time.perf_counter()
+
+    def gravar_lotes():
+        # Conversas primeiro: o mapa de ids remapeados precisa estar pronto para as mensagens
+        for tipo, linhas in lotes.items():
+            if not linhas:
+                continue
+            if tipo == "mensagem" and mapa_conversas:
+                linhas[:] = [(l[0], mapa_conversas.get(l[1], l[1])) + l[2:] for l in linhas]
+
+            novas, iguais, conflitantes = _separar_conflitos(cursor, tipo, linhas)
+            if conflitantes and not remapear_ids:
+                ids = [linha[0] for linha in conflitantes]
+                raise ConflitoDeIds(
+                    f"{len(ids)} {tipo}(s) com id já usado no banco por outro registro "
+                    f"(ids {ids[:10]}{'...' if len(ids) > 10 else ''}). "
+                    f"Use --remapear-ids para importá-las com ids novos."
+                )
+
+            # Com ids explícitos antes: um id gerado pelo banco não pode "roubar" um id do lote
+            if novas:
+                cursor.executemany(SQL_INSERT[tipo], novas)
+            if tipo == "conversa":
+                for linha in conflitantes:
+                    cursor.execute(SQL_INSERT_SEM_ID[tipo], linha[1:])
+                    mapa_conversas[linha[0]] = cursor.lastrowid
+                    cursor.execute(
+                        "INSERT INTO importacao_mapa_conversas (chave, id_antigo, id_novo) VALUES (%s, %s, %s)",
+                        (chave, linha[0], cursor.lastrowid))
+            elif conflitantes:
+                cursor.executemany(SQL_INSERT_SEM_ID[tipo], [linha[1:] for linha in conflitantes])
+
+            contagem[tipo] += len(novas) + len(conflitantes)
+            repetidas[tipo] += len(iguais)
+            remapeadas[tipo] += len(conflitantes)
+            linhas.clear()
+        _salvar_checkpoint(cursor, chave, caminho, posicao)
+        conn.commit()
+
+    try:
+        for tipo, registro in _registros_do_arquivo(caminho, formato):
+            posicao += 1
+            if posicao <= ja_importados:
+                continue
+            lotes[tipo].append(tuple(registro[col] for col in COLUNAS[tipo]))
+            if len(lotes[tipo]) >= TAMANHO_LOTE:
+                gravar_lotes()
+        gravar_lotes()
+        # Importação completa: o checkpoint não é mais necessário
+        _apagar_checkpoint(cursor, chave)
+        conn.commit()
+    except (mysql.connector.Error, ConflitoDeIds) as err:
+        conn.rollback()
+        print(f"Erro ao importar conversas (registro ~{posicao}): {err}")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+    duracao = time.perf_counter() - inicio
+    print(f"DEBUG: Importação concluída em {duracao:.1f}s: {contagem['conversa']} conversas, "
+          f"{contagem['mensagem']} mensagens ({contagem['mensagem'] / max(duracao, 1e-9) * 60:.0f} msgs/min).")
+    if any(repetidas.values()):
+        print(f"DEBUG: Puladas por já existirem iguais no banco: {repetidas['conversa']} conversas, "
+              f"{repetidas['mensagem']} mensagens.")
+    if any(remapeadas.values()):
+        print(f"DEBUG: Importadas com id novo (id original já usado): {remapeadas['conversa']} conversas, "
+              f"{remapeadas['mensagem']} mensagens.")
+    contagem["repetidas"] = repetidas
+    contagem["remapeadas"] = remapeadas
+    return contagem
+
+
+# Uso:
+#   python exportacao.py exportar backup.jsonl
+#   python exportacao.py exportar backup --formato parquet
+#   python exportacao.py importar backup.jsonl
+#   python exportacao.py importar backup.jsonl --remapear-ids   (ids já usados no banco ganham ids novos)
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Exportação/importação de conversas em streaming.",
+        epilog="Ordem do arquivo exportado: conversas (por id), mensagens da tabela quente (por id) e "
+               "depois as mensagens arquivadas (por conversa) — não é uma ordem global de id.")
+    parser.add_argument("comando", choices=["exportar", "importar"])
+    parser.add_argument("caminho")
+    parser.add_argument("--formato", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--remapear-ids", action="store_true")
+    args = parser.parse_args()
+
+    if args.comando == "exportar":
+        resultado = exportar_conversas(args.caminho, args.formato)
+    else:
+        resultado = importar_conversas(args.caminho, args.formato, args.remapear_ids)
+    print(f"\nResultado: {resultado}")
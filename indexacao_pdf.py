@@ -0,0 +1,205 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+# Chroma, PyPDFLoader e o text splitter são importados dentro das funções:
+# só quem anexa um PDF paga o custo desses imports.
+
+# Mesmo fatiamento usado desde o início no RAG
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# O índice vive na memória do processo: documentos sem uso há TTL_DOCUMENTO_S segundos
+# (a sessão que os enviou acabou ou largou o PDF) saem dele e têm a coleção do Chroma
+# apagada. Acima de MAX_DOCUMENTOS, sai também o usado há mais tempo.
+TTL_DOCUMENTO_S = 3600
+MAX_DOCUMENTOS = 50
+
+class ConflitoDeVersao(ValueError):
+    """A nova versão usaria o nome de outro documento da mesma sessão."""
+
+
+# Evita que duas sessões atualizem o mesmo índice ao mesmo tempo
+_trava_indice = threading.Lock()
+
+
+def hash_pagina(texto):
+    """Hash do conteúdo da página (ignorando diferenças de espaços/quebras de linha)."""
+    normalizado = " ".join(texto.split())
+    return hashlib.sha256(normalizado.encode("utf-8")).hexdigest()
+
+
+def carregar_paginas(file_content, file_name):
+    """Lê o PDF (via arquivo temporário) e retorna um Document por página."""
+    from langchain_community.document_loaders import PyPDFLoader
+    try:
+        with open(file_name, "wb") as f:
+            f.write(file_content)
+        return PyPDFLoader(file_name).load()
+    finally:
+        if os.path.exists(file_name):
+            os.remove(file_name)  # Limpa o arquivo temporário
+
+
+def _remover_documento(indice, chave):
+    documento = indice.pop(chave)
+    try:
+        documento["vector_store"].delete_collection()
+    except Exception as e:
+        print(f"DEBUG: Falha ao apagar a coleção do PDF '{chave[1]}': {e}")
+
+
+def limpar_indice(indice, agora=None):
+    """Tira do índice (e apaga do Chroma) os documentos expirados e os excedentes (LRU)."""
+    agora = time.monotonic() if agora is None else agora
+    with _trava_indice:
+        expirados = [c for c, d in indice.items() if agora - d["ultimo_uso"] > TTL_DOCUMENTO_S]
+        for chave in expirados:
+            _remover_documento(indice, chave)
+        excedentes = sorted(indice, key=lambda c: indice[c]["ultimo_uso"])[:max(0, len(indice) - MAX_DOCUMENTOS)]
+        for chave in excedentes:
+            _remover_documento(indice, chave)
+    if expirados or excedentes:
+        print(f"DEBUG: {len(expirados) + len(excedentes)} PDF(s) removidos do índice.")
+
+
+def usar_documento(indice, dono, nome):
+    """
+    Marca o documento como em uso (renova o TTL). Retorna False se ele já saiu do
+    índice: a coleção foi apagada e o PDF precisa ser anexado de novo.
+    """
+    with _trava_indice:
+        documento = indice.get((dono, nome))
+        if documento is None:
+            return False
+        documento["ultimo_uso"] = time.monotonic()
+    limpar_indice(indice)
+    return True
+
+
+def indexar_pdf(indice, file_content, file_name, embeddings, dono, versao_de=None):
+    """
+    Indexa o PDF no 'indice' (dict (dono, nome) -> documento) de forma incremental.
+
+    Cada documento pertence a uma linhagem: quem enviou ('dono', ex.: o id da sessão)
+    + o nome do documento. Um PDF só é tratado como nova versão dentro da própria
+    linhagem: mesmo nome enviado pelo mesmo dono, ou o documento 'versao_de'
+    (escolhido pelo usuário entre os seus). Documentos de outros donos nunca são
+    tocados, mesmo com o mesmo nome ou as mesmas páginas.
+
+    Numa nova versão, só as páginas novas/alteradas são fatiadas e embedadas;
+    as removidas saem do Chroma e as iguais são reaproveitadas.
+
+    Retorna (vector_store, relatorio) ou (None, None) se o PDF não tiver texto.
+    """
+    from langchain_community.vectorstores import Chroma
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    docs = carregar_paginas(file_content, file_name)
+    if not docs:
+        return None, None
+
+    # hash -> Document (páginas idênticas dentro do mesmo PDF são indexadas 1 vez só)
+    paginas = {}
+    for doc in docs:
+        paginas.setdefault(hash_pagina(doc.page_content), doc)
+
+    with _trava_indice:
+        chave_anterior = (dono, versao_de or file_name)
+        if versao_de and versao_de != file_name and (dono, file_name) in indice:
+            # Substituir a entrada de Y deixaria a linhagem de Y (e a coleção dela) perdida
+            raise ConflitoDeVersao(
+                f"Já existe outro documento chamado '{file_name}'. Para enviá-lo como nova versão "
+                f"de '{versao_de}', renomeie o arquivo ou escolha '{file_name}' como documento de origem."
+            )
+        anterior = indice.get(chave_anterior)
+        if anterior is None:
+            chave_anterior = None
+            # Nome único por documento: uma coleção nunca é reaberta por outra linhagem
+            nome_colecao = "pdf_" + uuid.uuid4().hex
+            vector_store = Chroma(collection_name=nome_colecao, embedding_function=embeddings)
+            paginas_antigas, versao = {}, 1
+        else:
+            vector_store = anterior["vector_store"]
+            paginas_antigas, versao = anterior["paginas"], anterior["versao"] + 1
+
+        novas = [h for h in paginas if h not in paginas_antigas]
+        removidas = [h for h in paginas_antigas if h not in paginas]
+        reaproveitadas = [h for h in paginas if h in paginas_antigas]
+
+        # Páginas novas ou alteradas: fatia só elas
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        registro_paginas = {}
+        splits_novos, ids_novos = [], []
+        for h in novas:
+            splits = text_splitter.split_documents([paginas[h]])
+            ids = [f"{h}-{i}" for i in range(len(splits))]
+            for split in splits:
+                split.metadata["hash_pagina"] = h
+            splits_novos.extend(splits)
+            ids_novos.extend(ids)
+            registro_paginas[h] = {
+                "pagina": paginas[h].metadata.get("page"),
+                "ids": ids,
+                "metadatas": [split.metadata for split in splits],
+            }
+
+        # Páginas iguais: reaproveita os embeddings; se mudaram de número, só corrige o metadado
+        # (registros novos: o da versão anterior só muda se tudo der certo)
+        metadados_alterados = {}
+        for h in reaproveitadas:
+            registro = paginas_antigas[h]
+            nova_pagina = paginas[h].metadata.get("page")
+            if registro["pagina"] != nova_pagina:
+                registro = {
+                    "pagina": nova_pagina,
+                    "ids": registro["ids"],
+                    "metadatas": [{**metadata, "page": nova_pagina} for metadata in registro["metadatas"]],
+                }
+                metadados_alterados[h] = registro
+            registro_paginas[h] = registro
+
+        # Altera o Chroma na ordem que permite desfazer: primeiro acrescenta (ids novos não
+        # colidem com os antigos), por último apaga. Se algo falhar, os trechos acrescentados
+        # saem e o índice continua descrevendo a versão anterior, cujos vetores seguem no Chroma.
+        try:
+            if splits_novos:
+                vector_store.add_documents(documents=splits_novos, ids=ids_novos)
+            for registro in metadados_alterados.values():
+                vector_store._collection.update(ids=registro["ids"], metadatas=registro["metadatas"])
+            ids_removidos = [i for h in removidas for i in paginas_antigas[h]["ids"]]
+            if ids_removidos:
+                vector_store.delete(ids=ids_removidos)
+        except Exception:
+            if anterior is None:
+                vector_store.delete_collection()
+            elif ids_novos:
+                vector_store.delete(ids=ids_novos)
+            raise
+
+        # Nova versão com outro nome: a linhagem passa a ser conhecida pelo nome novo
+        if chave_anterior and chave_anterior != (dono, file_name):
+            del indice[chave_anterior]
+        indice[(dono, file_name)] = {
+            "vector_store": vector_store, "paginas": registro_paginas, "versao": versao,
+            "ultimo_uso": time.monotonic(),
+        }
+    limpar_indice(indice)
+
+    chunks_total = sum(len(r["ids"]) for r in registro_paginas.values())
+    relatorio = {
+        "versao": versao,
+        "versao_de": chave_anterior[1] if chave_anterior else None,
+        "paginas": len(paginas),
+        "paginas_reaproveitadas": len(reaproveitadas),
+        "paginas_novas": len(novas),
+        "paginas_removidas": len(removidas),
+        "chunks_embedados": len(splits_novos),
+        "chunks_total": chunks_total,
+        # Fração dos embeddings que uma reconstrução completa faria e que foi evitada
+        "economia": 1 - len(splits_novos) / chunks_total if chunks_total else 0.0,
+    }
+    print(f"DEBUG: PDF '{file_name}' indexado (versão {versao}): {relatorio}")
+    return vector_store, relatorio
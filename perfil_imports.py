@@ -0,0 +1,70 @@
+import ast
+import os
+import subprocess
+import sys
+
+# Mede o tempo de import da INICIALIZAÇÃO do app.py: executa, num processo Python novo
+# (cache de import frio), só os imports de nível de módulo do app.py, com "python -X importtime".
+# Imports feitos dentro de funções (carregados no 1º uso de cada cérebro) ficam de fora.
+#
+# Uso: python perfil_imports.py [--top N] [--orcamento SEGUNDOS]
+# Sai com código 1 se o tempo total passar do orçamento.
+
+PASTA_PROJETO = os.path.dirname(os.path.abspath(__file__))
+
+# Orçamento de tempo de import na inicialização (segundos). Ajuste com ORCAMENTO_IMPORT_S no ambiente.
+ORCAMENTO_IMPORT_S = float(os.getenv("ORCAMENTO_IMPORT_S", "4.0"))
+
+
+def imports_de_inicializacao(arquivo="app.py"):
+    """Código-fonte só com os 'import' / 'from ... import' de nível de módulo do arquivo."""
+    with open(os.path.join(PASTA_PROJETO, arquivo), encoding="utf-8") as f:
+        arvore = ast.parse(f.read())
+    linhas = [ast.unparse(no) for no in arvore.body if isinstance(no, (ast.Import, ast.ImportFrom))]
+    return "\n".join(linhas)
+
+
+def medir_imports(codigo):
+    """
+    Roda o código num processo novo com -X importtime.
+    Retorna (total_segundos, [(cumulativo_s, proprio_s, modulo), ...]) ordenado do mais lento.
+    """
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=PASTA_PROJETO, capture_output=True, text=True,
+    )
+    if processo.returncode != 0:
+        raise RuntimeError(f"Falha ao importar os módulos da inicialização:\n{processo.stderr[-2000:]}")
+
+    modulos, total_us = [], 0
+    for linha in processo.stderr.splitlines():
+        # Formato: "import time:  self [us] | cumulative | imported package"
+        if not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        proprio, cumulativo, nome = linha[len("import time:"):].split("|", 2)
+        total_us += int(proprio)
+        modulos.append((int(cumulativo) / 1e6, int(proprio) / 1e6, nome.strip()))
+    modulos.sort(reverse=True)
+    return total_us / 1e6, modulos
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Perfil de tempo de import da inicialização do app.py.")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--orcamento", type=float, default=ORCAMENTO_IMPORT_S)
+    args = parser.parse_args()
+
+    codigo = imports_de_inicializacao()
+    print("Imports de inicialização do app.py:\n" + codigo + "\n")
+
+    total, modulos = medir_imports(codigo)
+    print(f"{'cumulativo (s)':>15} {'próprio (s)':>12}  módulo")
+    for cumulativo, proprio, nome in modulos[:args.top]:
+        print(f"{cumulativo:>15.3f} {proprio:>12.3f}  {nome}")
+
+    print(f"\nTempo total de import na inicialização: {total:.2f}s (orçamento: {args.orcamento:.2f}s)")
+    if total > args.orcamento:
+        print("ERRO: tempo de import acima do orçamento.")
+        sys.exit(1)
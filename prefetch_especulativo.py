@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+# Threads compartilhadas por todas as sessões do Streamlit. Cada mensagem dispara até
+# 3 ramos (geral, rag, sql); o padrão cobre 8 mensagens sendo roteadas ao mesmo tempo.
+# Ajuste com PREFETCH_MAX_WORKERS no ambiente.
+MAX_WORKERS = int(os.getenv("PREFETCH_MAX_WORKERS", str(3 * 8)))
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="prefetch")
+
+# Tempo máximo (segundos, contado a partir do início do prefetch) que o cérebro escolhido
+# espera pelo resultado especulativo. Estourou: o cérebro faz o trabalho do jeito normal.
+ORCAMENTO_POR_RAMO = {
+    "rag": 5.0,    # retriever.invoke(prompt)
+    "sql": 5.0,    # schema + linhas de exemplo da tabela 'vendas'
+    "geral": 2.0,  # histórico da conversa no banco
+}
+ORCAMENTO_PADRAO = 3.0
+
+# Métricas acumuladas desde que o processo subiu
+METRICAS = {
+    "ramos_iniciados": 0,
+    "ramos_usados": 0,
+    "ramos_do_cache": 0,        # nem disparado: o cérebro usou um resultado ainda válido de antes (cache, não prefetch)
+    "ramos_na_fila": 0,         # escolhido ainda não tinha começado: o cérebro fez o trabalho sem esperar
+    "ramos_cancelados": 0,      # descartados antes de começar (custo zero)
+    "ramos_desperdicados": 0,   # descartados depois de rodar
+    "estouros_orcamento": 0,
+    "erros": 0,
+    "segundos_economizados": 0.0,
+    "segundos_desperdicados": 0.0,
+}
+_trava_metricas = threading.Lock()
+
+
+def _registrar(**incrementos):
+    with _trava_metricas:
+        for chave, valor in incrementos.items():
+            METRICAS[chave] += valor
+
+
+def _cronometrar(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return resultado, time.perf_counter() - inicio
+
+
+def iniciar_prefetch(tarefas):
+    """
+    Dispara em paralelo as tarefas {nome_do_ramo: funcao_sem_argumentos}.
+    Retorna o dicionário de ramos em andamento, usado por usar_prefetch/descartar_prefetch.
+    As funções rodam fora da thread do Streamlit: não podem usar st.* nem st.session_state.
+    """
+    inicio = time.perf_counter()
+    _registrar(ramos_iniciados=len(tarefas))
+    return {
+        nome: {"futuro": _executor.submit(_cronometrar, funcao), "inicio": inicio}
+        for nome, funcao in tarefas.items()
+    }
+
+
+def usar_prefetch(prefetch, nome, fim_roteamento):
+    """
+    Pega o resultado especulativo do ramo 'nome' respeitando o orçamento do ramo.
+    Os outros ramos são descartados antes, para liberar as threads.
+    Retorna (True, resultado) ou (False, None) se o ramo não existe, ainda estava
+    na fila (pool ocupado), falhou ou estourou.
+    'fim_roteamento' é o time.perf_counter() de quando o roteador respondeu.
+    """
+    ramo = prefetch.pop(nome, None)
+    descartar_prefetch(prefetch)
+    if ramo is None:
+        return False, None
+
+    # Nem começou: esperar aqui seria ficar na fila atrás de ramos de outras mensagens
+    if ramo["futuro"].cancel():
+        _registrar(ramos_na_fila=1)
+        print(f"DEBUG: Prefetch '{nome}' ainda estava na fila; o cérebro faz o trabalho direto.")
+        return False, None
+
+    orcamento = ORCAMENTO_POR_RAMO.get(nome, ORCAMENTO_PADRAO)
+    restante = max(0.0, ramo["inicio"] + orcamento - time.perf_counter())
+    try:
+        resultado, duracao = ramo["futuro"].result(timeout=restante)
+    except TimeoutError:
+        ramo["futuro"].cancel()
+        _registrar(estouros_orcamento=1)
+        print(f"DEBUG: Prefetch '{nome}' estourou o orçamento de {orcamento}s.")
+        return False, None
+    except Exception as e:
+        _registrar(erros=1)
+        print(f"DEBUG: Prefetch '{nome}' falhou: {e}")
+        return False, None
+
+    # Economia = parte do trabalho que ficou escondida atrás da chamada do roteador
+    economizado = max(0.0, min(duracao, fim_roteamento - ramo["inicio"]))
+    _registrar(ramos_usados=1, segundos_economizados=economizado)
+    return True, resultado
+
+
+def descartar_prefetch(prefetch):
+    """Cancela os ramos que perderam. Os que já estão rodando contam como desperdício ao terminar."""
+    def registrar_desperdicio(futuro):
+        if not futuro.cancelled() and futuro.exception() is None:
+            _registrar(ramos_desperdicados=1, segundos_desperdicados=futuro.result()[1])
+
+    for ramo in prefetch.values():
+        if ramo["futuro"].cancel():
+            _registrar(ramos_cancelados=1)
+        else:
+            ramo["futuro"].add_done_callback(registrar_desperdicio)
+    prefetch.clear()
+
+
+def registrar_uso_cache(nome):
+    """Conta um ramo atendido por um resultado guardado de um prefetch anterior (não é especulação)."""
+    _registrar(ramos_do_cache=1)
+    print(f"DEBUG: Ramo '{nome}' atendido pelo cache (sem prefetch nesta mensagem).")
+
+
+def resumo_metricas():
+    """Cópia das métricas (para log/exibição)."""
+    with _trava_metricas:
+        return dict(METRICAS)
@@ -0,0 +1,335 @@
+import time
+import mysql.connector
+
+# Reaproveita a mesma conexão configurada no db.py
+from db import get_db_connection
+
+# --- Colunas da tabela 'vendas' usadas nos resumos ---
+# Ajuste aqui se o nome das colunas no seu banco for diferente.
+COL_ID = "id"                # Chave primária AUTO_INCREMENT (usada como marca d'água)
+COL_DATA = "data_venda"      # Data/hora da venda
+COL_PRODUTO = "produto"
+COL_CLIENTE = "cliente"
+COL_QUANTIDADE = "quantidade"
+COL_VALOR = "valor_total"
+
+# Tabelas de resumo (rollups) mantidas por este módulo.
+# A chave é o nome da tabela, o valor é a dimensão agrupada (além do dia).
+TABELAS_ROLLUP = {
+    "vendas_resumo_diario": None,
+    "vendas_resumo_produto": COL_PRODUTO,
+    "vendas_resumo_cliente": COL_CLIENTE,
+}
+
+# Quantas linhas novas de 'vendas' entram em cada transação de atualização.
+# Evita uma transação gigante na primeira carga de uma tabela com milhões de linhas.
+TAMANHO_LOTE = 500_000
+
+# Intervalo mínimo (segundos) entre duas atualizações disparadas pelo chat.
+INTERVALO_MINIMO_ATUALIZACAO = 60
+
+# O chat só soma atrasos pequenos, pois roda antes do agente responder.
+# Atrasos maiores ficam para o cron.
+MAX_IDS_ATUALIZACAO_CHAT = 5000
+
+# Ids AUTO_INCREMENT não são commitados em ordem: uma transação com o id N pode
+# commitar depois que N+1 já apareceu. Por isso a marca d'água só avança até um
+# MAX(id) observado há pelo menos esta janela (segundos). Supõe que nenhuma
+# transação que insere em 'vendas' fique aberta mais tempo que isso.
+JANELA_SEGURANCA_S = 60
+
+# De quanto em quanto tempo (segundos) o cron roda "python rollups_vendas.py".
+INTERVALO_CRON_S = 300
+
+# O agente só é orientado a usar os resumos se eles cobrem todas as vendas até no
+# máximo este tempo atrás. Mesmo em dia, a marca d'água fica atrás do agora pela
+# janela de segurança + até dois ciclos de atualização (um para registrar o
+# pendente, outro para somá-lo), independente de quantas vendas entram por segundo.
+DEFASAGEM_MAXIMA_S = JANELA_SEGURANCA_S + 2 * INTERVALO_CRON_S
+
+_ultima_atualizacao = 0.0
+_tabelas_verificadas = False
+
+
+def criar_tabelas_rollup():
+    """Cria as tabelas de resumo e a tabela de controle (marca d'água) se não existirem."""
+    global _tabelas_verificadas
+    conn = get_db_connection()
+    if not conn:
+        print("Não foi possível conectar ao banco para criar as tabelas de resumo.")
+        return False
+
+    success = False
+    cursor = conn.cursor()
+    try:
+        for tabela, dimensao in TABELAS_ROLLUP.items():
+            coluna_dimensao = f"{dimensao} VARCHAR(255) NOT NULL," if dimensao else ""
+            chave = f"dia, {dimensao}" if dimensao else "dia"
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {tabela} (
+                    dia DATE NOT NULL,
+                    {coluna_dimensao}
+                    qtd_vendas BIGINT NOT NULL DEFAULT 0,
+                    quantidade_total DECIMAL(20, 2) NOT NULL DEFAULT 0,
+                    valor_total DECIMAL(20, 2) NOT NULL DEFAULT 0,
+                    PRIMARY KEY ({chave})
+                );
+            """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS vendas_rollup_controle (
+                nome VARCHAR(64) PRIMARY KEY,
+                ultimo_id BIGINT NOT NULL DEFAULT 0,
+                id_pendente BIGINT NULL DEFAULT NULL,
+                data_id_pendente TIMESTAMP NULL DEFAULT NULL,
+                data_ultimo_id TIMESTAMP NULL DEFAULT NULL,
+                data_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            );
+        """)
+        cursor.execute(
+            "INSERT IGNORE INTO vendas_rollup_controle (nome, ultimo_id) VALUES ('vendas', 0)")
+        conn.commit()
+        success = True
+        _tabelas_verificadas = True
+        print("Tabelas de resumo de vendas verificadas/criadas com sucesso.")
+    except mysql.connector.Error as err:
+        print(f"Erro ao criar tabelas de resumo: {err}")
+    finally:
+        cursor.close()
+        conn.close()
+    return success
+
+
+def tabelas_rollup_existentes():
+    """Lista as tabelas de resumo que já existem no banco (criadas pelo cron)."""
+    conn = get_db_connection()
+    if not conn:
+        return []
+
+    existentes = []
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT table_name FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_name IN ({})
+        """.format(", ".join(["%s"] * len(TABELAS_ROLLUP))), tuple(TABELAS_ROLLUP))
+        nomes = {linha[0] for linha in cursor.fetchall()}
+        existentes = [tabela for tabela in TABELAS_ROLLUP if tabela in nomes]
+    except mysql.connector.Error as err:
+        print(f"Erro ao verificar tabelas de resumo: {err}")
+    finally:
+        cursor.close()
+        conn.close()
+    return existentes
+
+
+def rollups_disponiveis():
+    """
+    Indica se os resumos estão em dia: já somaram tudo até o MAX(id) de 'vendas'
+    ou cobrem todas as vendas até no máximo DEFASAGEM_MAXIMA_S segundos atrás
+    (data_ultimo_id). Resumos pela metade (carga inicial rodando ou com erro)
+    NÃO são oferecidos ao agente.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return False
+
+    disponivel = False
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT ultimo_id, COALESCE(data_ultimo_id >= NOW() - INTERVAL %s SECOND, FALSE)
+            FROM vendas_rollup_controle WHERE nome = 'vendas'
+        """, (DEFASAGEM_MAXIMA_S,))
+        linha = cursor.fetchone()
+        cursor.execute(f"SELECT COALESCE(MAX({COL_ID}), 0) FROM vendas")
+        max_id = cursor.fetchone()[0]
+        if linha is not None:
+            ultimo_id, recente = linha
+            disponivel = max_id <= ultimo_id or bool(recente)
+    except mysql.connector.Error as err:
+        if err.errno != 1146:  # 1146 = tabela de controle ainda não existe (cron nunca rodou)
+            print(f"Erro ao verificar marca d'água dos resumos: {err}")
+    finally:
+        cursor.close()
+        conn.close()
+    return disponivel
+
+
+def _sql_upsert_rollup(tabela, dimensao):
+    """Monta o INSERT ... SELECT que soma um intervalo de ids de 'vendas' no resumo."""
+    colunas = f"dia, {dimensao}, " if dimensao else "dia, "
+    select_dimensao = f"COALESCE({dimensao}, ''), " if dimensao else ""
+    agrupamento = f"DATE({COL_DATA}), COALESCE({dimensao}, '')" if dimensao else f"DATE({COL_DATA})"
+    return f"""
+        INSERT INTO {tabela} ({colunas}qtd_vendas, quantidade_total, valor_total)
+        SELECT DATE({COL_DATA}), {select_dimensao}COUNT(*),
+               COALESCE(SUM({COL_QUANTIDADE}), 0), COALESCE(SUM({COL_VALOR}), 0)
+        FROM vendas
+        WHERE {COL_ID} > %s AND {COL_ID} <= %s
+        GROUP BY {agrupamento}
+        ON DUPLICATE KEY UPDATE
+            qtd_vendas = qtd_vendas + VALUES(qtd_vendas),
+            quantidade_total = quantidade_total + VALUES(quantidade_total),
+            valor_total = valor_total + VALUES(valor_total)
+    """
+
+
+def atualizar_rollups_vendas(forcar=False, apenas_incremental=False):
+    """
+    Soma nos resumos apenas as vendas novas desde a última marca d'água (ultimo_id).
+    Retorna quantas linhas de 'vendas' foram processadas (ou None em caso de erro).
+
+    A marca d'água só avança até um MAX(id) registrado (id_pendente) há pelo menos
+    JANELA_SEGURANCA_S segundos; o MAX(id) atual fica pendente para a próxima execução.
+
+    'apenas_incremental' é o modo usado pelo chat: não cria tabelas e não soma mais
+    de MAX_IDS_ATUALIZACAO_CHAT ids atrasados — carga maior fica para o cron.
+
+    Considera 'vendas' como tabela só de inserção: UPDATE/DELETE em linhas antigas
+    não são refletidos aqui. Nesse caso use reconstruir_rollups_vendas().
+    """
+    global _ultima_atualizacao
+    agora = time.time()
+    if not forcar and agora - _ultima_atualizacao < INTERVALO_MINIMO_ATUALIZACAO:
+        return 0
+    _ultima_atualizacao = agora
+
+    if not apenas_incremental and not _tabelas_verificadas and not criar_tabelas_rollup():
+        return None
+
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    processadas = 0
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT COALESCE(MAX({COL_ID}), 0) FROM vendas")
+        max_id = cursor.fetchone()[0]
+
+        while True:
+            # Trava a linha de controle: dois processos não somam o mesmo intervalo
+            cursor.execute("""
+                SELECT ultimo_id, id_pendente, data_id_pendente <= NOW() - INTERVAL %s SECOND
+                FROM vendas_rollup_controle WHERE nome = 'vendas' FOR UPDATE
+            """, (JANELA_SEGURANCA_S,))
+            ultimo_id, id_pendente, pendente_maduro = cursor.fetchone()
+            alvo = id_pendente if id_pendente is not None and pendente_maduro else ultimo_id
+
+            if apenas_incremental and alvo - ultimo_id > MAX_IDS_ATUALIZACAO_CHAT:
+                conn.rollback()
+                print(f"DEBUG: Resumos de vendas {alvo - ultimo_id} ids atrasados: a carga fica para o cron.")
+                break
+
+            if ultimo_id >= alvo:
+                # Nada maduro para somar: registra o MAX(id) atual como o próximo alvo
+                # (se já houver um pendente esperando a janela, mantém o dele)
+                if (id_pendente is None or id_pendente <= ultimo_id) and max_id > ultimo_id:
+                    cursor.execute("""
+                        UPDATE vendas_rollup_controle SET id_pendente = %s, data_id_pendente = NOW()
+                        WHERE nome = 'vendas'
+                    """, (max_id,))
+                    conn.commit()
+                else:
+                    conn.rollback()
+                break
+
+            fim_lote = min(ultimo_id + TAMANHO_LOTE, alvo)
+            for tabela, dimensao in TABELAS_ROLLUP.items():
+                cursor.execute(_sql_upsert_rollup(tabela, dimensao), (ultimo_id, fim_lote))
+            if fim_lote == id_pendente:
+                # Chegou ao pendente: os resumos cobrem todas as vendas até o instante em que ele foi registrado
+                cursor.execute("""
+                    UPDATE vendas_rollup_controle SET ultimo_id = %s, data_ultimo_id = data_id_pendente
+                    WHERE nome = 'vendas'
+                """, (fim_lote,))
+            else:
+                cursor.execute(
+                    "UPDATE vendas_rollup_controle SET ultimo_id = %s WHERE nome = 'vendas'", (fim_lote,))
+            conn.commit()
+            processadas += fim_lote - ultimo_id
+
+        if processadas:
+            print(f"DEBUG: Resumos de vendas atualizados ({processadas} ids novos).")
+    except mysql.connector.Error as err:
+        conn.rollback()
+        if not (apenas_incremental and err.errno == 1146):  # 1146 = cron ainda não criou as tabelas
+            print(f"Erro ao atualizar resumos de vendas: {err}")
+        processadas = None
+    finally:
+        cursor.close()
+        conn.close()
+    return processadas
+
+
+def reconstruir_rollups_vendas():
+    """Apaga os resumos e recalcula tudo do zero (use após UPDATE/DELETE em 'vendas')."""
+    if not criar_tabelas_rollup():
+        return None
+
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    cursor = conn.cursor()
+    try:
+        for tabela in TABELAS_ROLLUP:
+            cursor.execute(f"DELETE FROM {tabela}")
+        cursor.execute("""
+            UPDATE vendas_rollup_controle
+            SET ultimo_id = 0, id_pendente = NULL, data_id_pendente = NULL, data_ultimo_id = NULL
+            WHERE nome = 'vendas'
+        """)
+        conn.commit()
+    except mysql.connector.Error as err:
+        conn.rollback()
+        print(f"Erro ao limpar resumos de vendas: {err}")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+    return atualizar_rollups_vendas(forcar=True)
+
+
+# Instrução extra para o Agente SQL: preferir os resumos às agregações na tabela bruta.
+# (Sem chaves { } porque o texto é concatenado a um template do LangChain)
+INSTRUCOES_ROLLUP = f"""
+
+Além da tabela 'vendas' existem tabelas de RESUMO já agregadas por dia, atualizadas a cada poucos minutos:
+- vendas_resumo_diario (dia, qtd_vendas, quantidade_total, valor_total)
+- vendas_resumo_produto (dia, {COL_PRODUTO}, qtd_vendas, quantidade_total, valor_total)
+- vendas_resumo_cliente (dia, {COL_CLIENTE}, qtd_vendas, quantidade_total, valor_total)
+Para totais, contagens, somas ou médias por período, produto ou cliente, consulte SEMPRE
+essas tabelas de resumo (somando as linhas de 'dia' do período pedido) em vez de agregar 'vendas'.
+Use a tabela 'vendas' apenas quando a pergunta precisar de vendas individuais ou de colunas
+que não existem nos resumos.
+"""
+
+# Usada quando os resumos existem mas estão atrasados (carga inicial rodando ou com erro)
+INSTRUCOES_ROLLUP_INDISPONIVEL = """
+
+As tabelas vendas_resumo_* estão DESATUALIZADAS no momento: NÃO as use. Consulte apenas a tabela 'vendas'.
+"""
+
+
+# Se você rodar este arquivo diretamente (python rollups_vendas.py), ele cria e atualiza os resumos.
+# É aqui (no cron) que a carga inicial acontece; o chat só faz atualizações pequenas.
+# Use "--reconstruir" para recalcular tudo do zero.
+if __name__ == "__main__":
+    import sys
+    inicio = time.perf_counter()
+    if "--reconstruir" in sys.argv:
+        print("Reconstruindo resumos de vendas do zero...")
+        resultado = reconstruir_rollups_vendas()
+    else:
+        print("Atualizando resumos de vendas (incremental)...")
+        resultado = atualizar_rollups_vendas(forcar=True)
+
+    # Na 1ª execução (ou após reconstruir) só o MAX(id) é registrado como pendente:
+    # espera a janela de segurança e roda de novo para já somar tudo.
+    if resultado == 0 and not rollups_disponiveis():
+        print(f"Aguardando a janela de segurança ({JANELA_SEGURANCA_S}s) para somar o pendente...")
+        time.sleep(JANELA_SEGURANCA_S + 1)
+        resultado = atualizar_rollups_vendas(forcar=True)
+    print(f"\nLinhas processadas: {resultado} em {time.perf_counter() - inicio:.2f}s")
+    print(f"Resumos disponíveis para o agente: {rollups_disponiveis()}")
@@ -0,0 +1,83 @@
+import pytest
+
+Document = pytest.importorskip("langchain_core.documents").Document
+
+from compressao_contexto import _frases_sem_sobreposicao, comprimir_contexto, estimar_tokens
+
+
+class EmbeddingsFalsos:
+    """Vetor = quantas vezes cada palavra do vocabulário aparece no texto."""
+    VOCABULARIO = ["garantia", "meses", "troca", "dias", "frete", "loja"]
+
+    def _vetor(self, texto):
+        texto = texto.lower()
+        return [texto.count(palavra) for palavra in self.VOCABULARIO]
+
+    def embed_query(self, texto):
+        return self._vetor(texto)
+
+    def embed_documents(self, textos):
+        return [self._vetor(t) for t in textos]
+
+
+def doc(texto, pagina):
+    return Document(page_content=texto, metadata={"page": pagina})
+
+
+def textos(frases):
+    return [f["texto"] for f in frases]
+
+
+def test_frase_repetida_na_sobreposicao_entra_uma_vez():
+    documentos = [
+        doc("A garantia é de doze meses. O frete de devolução é pago pela loja.", 0),
+        doc("O frete de devolução é pago pela loja. Trocas em até sete dias corridos.", 0),
+    ]
+    assert textos(_frases_sem_sobreposicao(documentos)) == [
+        "A garantia é de doze meses.",
+        "O frete de devolução é pago pela loja.",
+        "Trocas em até sete dias corridos.",
+    ]
+
+
+def test_frase_cortada_na_borda_do_chunk_e_trocada_pela_completa():
+    documentos = [
+        doc("A garantia é de doze meses. Trocas em até sete dias", 0),
+        doc("Trocas em até sete dias corridos. O frete de devolução é pago pela loja.", 0),
+    ]
+    assert textos(_frases_sem_sobreposicao(documentos)) == [
+        "A garantia é de doze meses.",
+        "Trocas em até sete dias corridos.",
+        "O frete de devolução é pago pela loja.",
+    ]
+
+
+def test_mesma_frase_em_paginas_diferentes_e_mantida():
+    documentos = [doc("Consulte o manual do fabricante.", 0), doc("Consulte o manual do fabricante.", 3)]
+    assert [f["pagina"] for f in _frases_sem_sobreposicao(documentos)] == [0, 3]
+
+
+def test_compressao_respeita_orcamento_e_mantem_ordem_e_paginas():
+    documentos = [
+        doc("O frete de devolução é pago pela loja. A garantia é de doze meses.", 0),
+        doc("Trocas em até sete dias corridos. A garantia estendida custa à parte.", 4),
+    ]
+    orcamento = estimar_tokens("A garantia é de doze meses.") + estimar_tokens("A garantia estendida custa à parte.")
+    contexto, estatisticas = comprimir_contexto("Qual a garantia?", documentos, EmbeddingsFalsos(), orcamento)
+
+    assert contexto == "[Página 1] A garantia é de doze meses.\n[Página 5] A garantia estendida custa à parte."
+    assert estatisticas["frases"] == 4 and estatisticas["frases_mantidas"] == 2
+    assert estatisticas["tokens_comprimidos"] <= estatisticas["tokens_originais"]
+
+
+def test_tokens_originais_contam_so_o_texto_dos_trechos():
+    documentos = [doc("A garantia é de doze meses.", 0), doc("Trocas em até sete dias corridos.", 1)]
+    _, estatisticas = comprimir_contexto("garantia", documentos, EmbeddingsFalsos())
+    assert estatisticas["tokens_originais"] == sum(estimar_tokens(d.page_content) for d in documentos)
+
+
+def test_mantem_ao_menos_uma_frase_mesmo_acima_do_orcamento():
+    documentos = [doc("A garantia é de doze meses a partir da data da compra.", 0)]
+    contexto, estatisticas = comprimir_contexto("garantia", documentos, EmbeddingsFalsos(), orcamento_tokens=1)
+    assert estatisticas["frases_mantidas"] == 1
+    assert contexto.startswith("[Página 1] A garantia")
@@ -0,0 +1,164 @@
+import pytest
+
+Document = pytest.importorskip("langchain_core.documents").Document
+pytest.importorskip("langchain_text_splitters")
+vectorstores = pytest.importorskip("langchain_community.vectorstores")
+
+import indexacao_pdf
+from indexacao_pdf import ConflitoDeVersao, indexar_pdf, limpar_indice, usar_documento
+
+# Páginas curtas (bem menores que CHUNK_SIZE): cada uma vira exatamente 1 trecho
+TEXTO = {
+    "a": "Capítulo 1. A garantia do produto é de doze meses a partir da compra.",
+    "b": "Capítulo 2. Trocas podem ser pedidas em até sete dias corridos.",
+    "c": "Capítulo 3. O frete de devolução é pago pela loja.",
+    "d": "Capítulo 4. Assistência técnica apenas em oficinas autorizadas.",
+}
+
+
+class ChromaFalso:
+    """Guarda os trechos num dict (id -> metadados) e registra as chamadas."""
+    colecoes = []
+
+    def __init__(self, collection_name, embedding_function):
+        self.nome = collection_name
+        self.trechos = {}
+        self.apagada = False
+        self.falhar_ao_apagar = False
+        self.chamadas = []
+        store = self
+
+        class Colecao:
+            def update(self, ids, metadatas):
+                store.chamadas.append(("update", list(ids)))
+                for i, metadata in zip(ids, metadatas):
+                    store.trechos[i] = dict(metadata)
+
+        self._collection = Colecao()
+        ChromaFalso.colecoes.append(self)
+
+    def add_documents(self, documents, ids):
+        self.chamadas.append(("add", list(ids)))
+        for doc, i in zip(documents, ids):
+            self.trechos[i] = dict(doc.metadata)
+
+    def delete(self, ids):
+        self.chamadas.append(("delete", list(ids)))
+        if self.falhar_ao_apagar:
+            self.falhar_ao_apagar = False  # só a 1ª chamada falha (a de desfazer funciona)
+            raise RuntimeError("falha simulada no Chroma")
+        for i in ids:
+            self.trechos.pop(i, None)
+
+    def delete_collection(self):
+        self.apagada = True
+        self.trechos.clear()
+
+
+@pytest.fixture(autouse=True)
+def chroma_falso(monkeypatch):
+    ChromaFalso.colecoes = []
+    monkeypatch.setattr(vectorstores, "Chroma", ChromaFalso, raising=False)
+
+
+def pdf(monkeypatch, *chaves):
+    """Faz carregar_paginas devolver as páginas 'chaves', na ordem (metadado 'page' = posição)."""
+    paginas = [Document(page_content=TEXTO[c], metadata={"page": n}) for n, c in enumerate(chaves)]
+    monkeypatch.setattr(indexacao_pdf, "carregar_paginas", lambda conteudo, nome: paginas)
+
+
+def test_primeira_versao_embeda_todas_as_paginas(monkeypatch):
+    indice = {}
+    pdf(monkeypatch, "a", "b", "c")
+    store, relatorio = indexar_pdf(indice, b"", "manual.pdf", None, "sessao1")
+
+    assert relatorio["versao"] == 1 and relatorio["versao_de"] is None
+    assert relatorio["paginas_novas"] == 3 and relatorio["chunks_embedados"] == 3
+    assert relatorio["economia"] == 0.0
+    assert len(store.trechos) == 3
+    assert indice[("sessao1", "manual.pdf")]["vector_store"] is store
+
+
+def test_nova_versao_reaproveita_move_acrescenta_e_remove_paginas(monkeypatch):
+    indice = {}
+    pdf(monkeypatch, "a", "b", "c")
+    store, _ = indexar_pdf(indice, b"", "manual.pdf", None, "sessao1")
+    ids_antigos = dict(indice[("sessao1", "manual.pdf")]["paginas"])
+
+    # 'a' sai, 'c' muda da página 2 para a 0, 'b' fica no lugar, 'd' é nova
+    pdf(monkeypatch, "c", "b", "d")
+    store2, relatorio = indexar_pdf(indice, b"", "manual.pdf", None, "sessao1")
+
+    assert store2 is store
+    assert relatorio["versao"] == 2 and relatorio["versao_de"] == "manual.pdf"
+    assert (relatorio["paginas_reaproveitadas"], relatorio["paginas_novas"], relatorio["paginas_removidas"]) == (2, 1, 1)
+    assert relatorio["chunks_embedados"] == 1 and relatorio["chunks_total"] == 3
+
+    hash_a, hash_c = (indexacao_pdf.hash_pagina(TEXTO[c]) for c in "ac")
+    assert not set(ids_antigos[hash_a]["ids"]) & set(store.trechos)
+    assert all(store.trechos[i]["page"] == 0 for i in ids_antigos[hash_c]["ids"])
+    # Acrescenta antes de apagar: uma falha no meio nunca deixa páginas sem vetores
+    assert [tipo for tipo, _ in store.chamadas][-3:] == ["add", "update", "delete"]
+    # O registro da versão anterior não foi alterado no lugar
+    assert ids_antigos[hash_c]["pagina"] == 2
+
+
+def test_mesmo_nome_de_outra_sessao_nao_toca_no_documento(monkeypatch):
+    indice = {}
+    pdf(monkeypatch, "a", "b")
+    store1, _ = indexar_pdf(indice, b"", "manual.pdf", None, "sessao1")
+    pdf(monkeypatch, "a", "c")
+    store2, relatorio = indexar_pdf(indice, b"", "manual.pdf", None, "sessao2")
+
+    assert store2 is not store1 and store2.nome != store1.nome
+    assert relatorio["versao"] == 1
+    assert len(store1.trechos) == 2 and not any(tipo == "delete" for tipo, _ in store1.chamadas)
+
+
+def test_renomear_para_nome_de_outro_documento_e_rejeitado(monkeypatch):
+    indice = {}
+    pdf(monkeypatch, "a")
+    indexar_pdf(indice, b"", "x.pdf", None, "sessao1")
+    pdf(monkeypatch, "b")
+    store_y, _ = indexar_pdf(indice, b"", "y.pdf", None, "sessao1")
+
+    pdf(monkeypatch, "a", "c")
+    with pytest.raises(ConflitoDeVersao):
+        indexar_pdf(indice, b"", "y.pdf", None, "sessao1", versao_de="x.pdf")
+    assert indice[("sessao1", "y.pdf")]["vector_store"] is store_y
+    assert ("sessao1", "x.pdf") in indice
+
+
+def test_falha_no_chroma_mantem_o_indice_da_versao_anterior(monkeypatch):
+    indice = {}
+    pdf(monkeypatch, "a", "b")
+    store, _ = indexar_pdf(indice, b"", "manual.pdf", None, "sessao1")
+    registro_antes = dict(indice[("sessao1", "manual.pdf")])
+    trechos_antes = dict(store.trechos)
+
+    store.falhar_ao_apagar = True
+    pdf(monkeypatch, "b", "c")
+    with pytest.raises(RuntimeError):
+        indexar_pdf(indice, b"", "manual.pdf", None, "sessao1")
+
+    assert indice[("sessao1", "manual.pdf")] == registro_antes
+    assert set(store.trechos) == set(trechos_antes)  # o trecho acrescentado foi desfeito
+
+
+def test_documentos_expirados_ou_excedentes_saem_do_indice(monkeypatch):
+    monkeypatch.setattr(indexacao_pdf, "MAX_DOCUMENTOS", 2)
+    indice = {}
+    for nome, chave in (("1.pdf", "a"), ("2.pdf", "b"), ("3.pdf", "c")):
+        pdf(monkeypatch, chave)
+        indexar_pdf(indice, b"", nome, None, "sessao1")
+        usar_documento(indice, "sessao1", nome)
+
+    # O usado há mais tempo saiu e teve a coleção apagada
+    assert set(indice) == {("sessao1", "2.pdf"), ("sessao1", "3.pdf")}
+    assert ChromaFalso.colecoes[0].apagada
+    assert not usar_documento(indice, "sessao1", "1.pdf")
+
+    agora = max(d["ultimo_uso"] for d in indice.values()) + indexacao_pdf.TTL_DOCUMENTO_S + 1
+    limpar_indice(indice, agora=agora)
+    assert indice == {}
+    assert all(store.apagada for store in ChromaFalso.colecoes)
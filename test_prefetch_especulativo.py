@@ -0,0 +1,103 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import prefetch_especulativo
+from prefetch_especulativo import descartar_prefetch, iniciar_prefetch, resumo_metricas, usar_prefetch
+
+
+def variacao(antes, chave):
+    return resumo_metricas()[chave] - antes[chave]
+
+
+def esperar_metrica(antes, chave, timeout=2.0):
+    """Os callbacks de desperdício rodam na thread do pool logo após a tarefa terminar."""
+    limite = time.perf_counter() + timeout
+    while variacao(antes, chave) == 0 and time.perf_counter() < limite:
+        time.sleep(0.01)
+    return variacao(antes, chave)
+
+
+def iniciar_e_esperar(nome, funcao):
+    """Dispara o ramo e só volta quando ele já começou a rodar (um ramo ainda na fila é cancelado)."""
+    comecou = threading.Event()
+
+    def tarefa():
+        comecou.set()
+        return funcao()
+
+    prefetch = iniciar_prefetch({nome: tarefa})
+    assert comecou.wait(2)
+    return prefetch
+
+
+@pytest.fixture
+def pool_de_uma_thread(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(prefetch_especulativo, "_executor", executor)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def test_ramo_escolhido_dentro_do_orcamento_e_usado():
+    antes = resumo_metricas()
+    prefetch = iniciar_e_esperar("geral", lambda: "historico")
+    assert usar_prefetch(prefetch, "geral", time.perf_counter()) == (True, "historico")
+    assert variacao(antes, "ramos_usados") == 1
+
+
+def test_ramo_que_estoura_o_orcamento_e_abandonado(monkeypatch):
+    monkeypatch.setitem(prefetch_especulativo.ORCAMENTO_POR_RAMO, "lento", 0.05)
+    antes = resumo_metricas()
+    prefetch = iniciar_e_esperar("lento", lambda: time.sleep(0.5))
+    assert usar_prefetch(prefetch, "lento", time.perf_counter()) == (False, None)
+    assert variacao(antes, "estouros_orcamento") == 1
+
+
+def test_ramo_com_erro_nao_propaga_a_excecao():
+    def falha():
+        raise RuntimeError("banco fora do ar")
+
+    antes = resumo_metricas()
+    prefetch = iniciar_e_esperar("sql", falha)
+    assert usar_prefetch(prefetch, "sql", time.perf_counter()) == (False, None)
+    assert variacao(antes, "erros") == 1
+
+
+def test_ramo_escolhido_ainda_na_fila_nao_espera(pool_de_uma_thread):
+    liberar = threading.Event()
+    ocupado = iniciar_prefetch({"outra_mensagem": lambda: liberar.wait(5)})
+    try:
+        antes = resumo_metricas()
+        prefetch = iniciar_prefetch({"rag": lambda: "trechos"})
+        inicio = time.perf_counter()
+        assert usar_prefetch(prefetch, "rag", inicio) == (False, None)
+        assert time.perf_counter() - inicio < 1.0
+        assert variacao(antes, "ramos_na_fila") == 1
+    finally:
+        liberar.set()
+        descartar_prefetch(ocupado)
+
+
+def test_ramos_perdedores_sao_cancelados_ou_contados_como_desperdicio(pool_de_uma_thread):
+    liberar = threading.Event()
+    comecou = threading.Event()
+
+    def perdedor_rodando():
+        comecou.set()
+        liberar.wait(5)
+        return "schema"
+
+    antes = resumo_metricas()
+    prefetch = iniciar_prefetch({"sql": perdedor_rodando, "rag": lambda: "trechos"})
+    assert comecou.wait(2)
+    descartar_prefetch(prefetch)
+    assert prefetch == {}
+    # 'rag' ainda estava na fila: cancelado sem custo
+    assert variacao(antes, "ramos_cancelados") == 1
+    # 'sql' já rodava: termina e conta como trabalho desperdiçado
+    liberar.set()
+    assert esperar_metrica(antes, "ramos_desperdicados") == 1
+    assert variacao(antes, "segundos_desperdicados") > 0
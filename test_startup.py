@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+from perfil_imports import ORCAMENTO_IMPORT_S, imports_de_inicializacao, medir_imports
+
+# Os testes importam de verdade os módulos da inicialização do app.py (num processo novo):
+# sem as dependências do app instaladas não há o que medir.
+for _modulo in ("streamlit", "langchain_core", "dotenv", "mysql.connector"):
+    pytest.importorskip(_modulo)
+
+# Módulos que só podem ser carregados no 1º uso do cérebro que precisa deles
+MODULOS_ADIADOS = [
+    "torch",
+    "sentence_transformers",
+    "langchain_huggingface",
+    "chromadb",
+    "langchain_google_genai",
+    "langchain_community.agent_toolkits",
+    "langchain_community.vectorstores",
+    "langchain_community.document_loaders",
+    "sqlalchemy",
+]
+
+
+# Tempo de relógio varia com a máquina (CI lento = falso alarme): o orçamento só é
+# verificado quando ORCAMENTO_IMPORT_S é definido no ambiente.
+@pytest.mark.skipif("ORCAMENTO_IMPORT_S" not in os.environ,
+                    reason="defina ORCAMENTO_IMPORT_S para verificar o tempo de import")
+def test_inicializacao_dentro_do_orcamento():
+    total, modulos = medir_imports(imports_de_inicializacao())
+    mais_lentos = ", ".join(f"{nome} ({cumulativo:.2f}s)" for cumulativo, _, nome in modulos[:5])
+    assert total <= ORCAMENTO_IMPORT_S, (
+        f"Import da inicialização levou {total:.2f}s (orçamento {ORCAMENTO_IMPORT_S}s). Mais lentos: {mais_lentos}")
+
+
+def test_inicializacao_nao_importa_modulos_pesados():
+    _, modulos = medir_imports(imports_de_inicializacao())
+    importados = {nome for _, _, nome in modulos}
+    carregados_cedo = [m for m in MODULOS_ADIADOS if m in importados]
+    assert not carregados_cedo, f"Importados na inicialização (deveriam ser adiados): {carregados_cedo}"